@@ -85,6 +85,15 @@ async function buildEndpointOption(req, res, next) {
     // TODO: use object params
     req.body.endpointOption = await builder(endpoint, parsedBody, endpointType);
 
+    // Research ranked against this message (researchContext.js): appended to the system prompt like
+    // the artifacts prompt, for this request only and never saved with the conversation
+    if (req.researchPrompt && !isAgents) {
+      const { artifactsPrompt } = req.body.endpointOption;
+      req.body.endpointOption.artifactsPrompt = [artifactsPrompt, req.researchPrompt]
+        .filter(Boolean)
+        .join('\n\n');
+    }
+
     // TODO: use `getModelsConfig` only when necessary
     const modelsConfig = await getModelsConfig(req);
     const { resendFiles = true } = req.body.endpointOption;
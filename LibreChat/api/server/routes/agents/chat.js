@@ -11,6 +11,7 @@ const {
 const { initializeClient } = require('~/server/services/Endpoints/agents');
 const AgentController = require('~/server/controllers/agents/request');
 const addTitle = require('~/server/services/Endpoints/agents/title');
+const { getMessageResearchContext } = require('../../../../researchContext');
 
 const router = express.Router();
 
@@ -31,6 +32,7 @@ router.post(
   // validateModel,
   checkAgentAccess,
   validateConvoAccess,
+  getMessageResearchContext,
   buildEndpointOption,
   setHeaders,
   async (req, res, next) => {
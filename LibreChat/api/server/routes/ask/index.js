@@ -15,6 +15,7 @@ const {
   messageUserLimiter,
   validateConvoAccess,
 } = require('~/server/middleware');
+const { getMessageResearchContext } = require('../../../../researchContext');
 
 const { LIMIT_CONCURRENT_MESSAGES, LIMIT_MESSAGE_IP, LIMIT_MESSAGE_USER } = process.env ?? {};
 
@@ -37,6 +38,8 @@ if (isEnabled(LIMIT_MESSAGE_USER)) {
 }
 
 router.use(validateConvoAccess);
+// Rank the project's research against the message being sent
+router.use(getMessageResearchContext);
 
 router.use([`/${EModelEndpoint.azureOpenAI}`, `/${EModelEndpoint.openAI}`], openAI);
 router.use(`/${EModelEndpoint.gptPlugins}`, gptPlugins);
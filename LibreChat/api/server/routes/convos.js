@@ -16,24 +16,7 @@ const assistantClients = {
   [EModelEndpoint.assistants]: require('~/server/services/Endpoints/assistants'),
 };
 
-const getResearchContext = async (req, res, next) => {
-  try {
-    const projectId = req.headers['x-project-id'];
-    if (!projectId) {
-      return next();
-    }
-
-    // Connect to your FastAPI backend
-    const response = await axios.get(`http://localhost:8000/chat_context/${projectId}`);
-    
-    // Attach research context to the request
-    req.researchContext = response.data;
-    next();
-  } catch (error) {
-    console.error('Error fetching research context:', error);
-    next();
-  }
-};
+const getResearchContext = require('../../../researchContext');
 
 const router = express.Router();
 router.use(requireJwtAuth);
@@ -154,6 +154,13 @@ const initializeAgentOptions = async ({
     });
   }
 
+  // Research ranked against this message (researchContext.js); per request, never saved
+  if (req.researchPrompt) {
+    agent.additional_instructions = [agent.additional_instructions, req.researchPrompt]
+      .filter(Boolean)
+      .join('\n\n');
+  }
+
   const tokensModel =
     agent.provider === EModelEndpoint.azureOpenAI ? agent.model : agent.model_parameters.model;
 
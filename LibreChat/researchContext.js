@@ -1,5 +1,19 @@
 const axios = require('axios');
 
+// Last context payload per project, revalidated with its ETag on every request
+const contextCache = new Map();
+
+// Token budget for query-ranked context; full project context is used when there is no query
+const tokenBudget = parseInt(process.env.RESEARCH_CONTEXT_TOKEN_BUDGET || '1500', 10);
+
+// Research items ranked against `query` (the user's message), trimmed to the token budget
+const fetchRankedContext = async (projectId, query) => {
+  const response = await axios.get(`http://localhost:8000/chat_context/${projectId}`, {
+    params: { query, token_budget: tokenBudget },
+  });
+  return response.data;
+};
+
 const getResearchContext = async (req, res, next) => {
   try {
     const projectId = req.headers['x-project-id'];
@@ -7,11 +21,54 @@ const getResearchContext = async (req, res, next) => {
       return next();
     }
 
-    // Connect to your FastAPI backend
-    const response = await axios.get(`http://localhost:8000/chat_context/${projectId}`);
-    
-    // Attach research context to the request
-    req.researchContext = response.data;
+    const query = req.headers['x-research-query'];
+    if (query) {
+      req.researchContext = await fetchRankedContext(projectId, query);
+      return next();
+    }
+
+    const cached = contextCache.get(projectId);
+
+    // Connect to your FastAPI backend; a 304 means the cached payload is still current
+    const response = await axios.get(`http://localhost:8000/chat_context/${projectId}`, {
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+
+    if (response.status === 304 && cached) {
+      req.researchContext = cached.data;
+    } else {
+      if (response.headers.etag) {
+        contextCache.set(projectId, { etag: response.headers.etag, data: response.data });
+      }
+      req.researchContext = response.data;
+    }
+    next();
+  } catch (error) {
+    console.error('Error fetching research context:', error);
+    next();
+  }
+};
+
+// For message routes: rank the project's research against the message being sent and hand it to the
+// model as system context for this request only (req.researchPrompt, see buildEndpointOption). It must
+// not go into promptPrefix, which is saved with the conversation and would pile up a block per turn.
+const getMessageResearchContext = async (req, res, next) => {
+  try {
+    const projectId = req.headers['x-project-id'];
+    const text = req.body?.text;
+    if (!projectId || !text) {
+      return next();
+    }
+
+    req.researchContext = await fetchRankedContext(projectId, text);
+    const items = req.researchContext.research_summary ?? [];
+    if (items.length) {
+      req.researchPrompt = [
+        `Relevant research from project "${req.researchContext.project_name}":`,
+        ...items.map((item) => `- ${item.title} (${item.url})`),
+      ].join('\n');
+    }
     next();
   } catch (error) {
     console.error('Error fetching research context:', error);
@@ -19,4 +76,5 @@ const getResearchContext = async (req, res, next) => {
   }
 };
 
-module.exports = getResearchContext;
\ No newline at end of file
+module.exports = getResearchContext;
+module.exports.getMessageResearchContext = getMessageResearchContext;
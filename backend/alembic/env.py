@@ -18,10 +18,13 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata  # This enables autogenerate
 
 # ✅ Database URL - Use either alembic.ini OR environment variable
-db_url = config.get_main_option("sqlalchemy.url") or os.getenv("DATABASE_URL")
+# DATABASE_URL (as used by the app, see database.py) takes precedence over alembic.ini
+db_url = os.getenv("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
 if not db_url:
     raise ValueError("❌ DATABASE_URL is not set in alembic.ini or environment variables.")
 
+config.set_main_option("sqlalchemy.url", db_url)
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode (without connecting to DB)."""
     context.configure(
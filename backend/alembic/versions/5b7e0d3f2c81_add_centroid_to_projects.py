@@ -0,0 +1,66 @@
+"""Add centroid and item_count to projects
+
+Revision ID: 5b7e0d3f2c81
+Revises: 8f2d6c1a9b47
+Create Date: 2025-03-19 14:05:37.204611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+
+from embeddings import encode_embedding, decode_embedding
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e0d3f2c81'
+down_revision: Union[str, None] = '8f2d6c1a9b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _populate_centroids():
+    """Fold existing research item embeddings into per-project centroids, BATCH_SIZE rows at a time."""
+    conn = op.get_bind()
+    items = sa.table('research_items', sa.column('id', sa.Integer), sa.column('project_id', sa.Integer), sa.column('embedding', sa.LargeBinary))
+    projects = sa.table('projects', sa.column('id', sa.Integer), sa.column('centroid', sa.LargeBinary), sa.column('item_count', sa.Integer))
+
+    sums, counts = {}, {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(items.c.id, items.c.project_id, items.c.embedding)
+            .where(items.c.id > last_id, items.c.project_id.isnot(None), items.c.embedding.isnot(None))
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for _, project_id, embedding in rows:
+            sums[project_id] = sums.get(project_id, 0) + decode_embedding(embedding).astype(np.float64)
+            counts[project_id] = counts.get(project_id, 0) + 1
+        last_id = rows[-1][0]
+
+    if sums:
+        conn.execute(
+            projects.update().where(projects.c.id == sa.bindparam('_id')).values(centroid=sa.bindparam('_centroid'), item_count=sa.bindparam('_count')),
+            [{'_id': pid, '_centroid': encode_embedding(sums[pid] / counts[pid], np.dtype(np.float32)), '_count': counts[pid]} for pid in sums],
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('projects', sa.Column('centroid', sa.LargeBinary(), nullable=True))
+    op.add_column('projects', sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+    _populate_centroids()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('centroid')
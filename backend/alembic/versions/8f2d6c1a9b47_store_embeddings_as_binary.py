@@ -0,0 +1,63 @@
+"""Store research_items.embedding as binary instead of JSON text
+
+Revision ID: 8f2d6c1a9b47
+Revises: 03504786642b
+Create Date: 2025-03-18 10:42:13.512904
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from embeddings import encode_embedding, decode_embedding
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d6c1a9b47'
+down_revision: Union[str, None] = '03504786642b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+DIMENSION = 384
+
+
+def _convert_in_batches(source, target, convert):
+    """Copy `source` into `target` for every row, BATCH_SIZE rows per round trip."""
+    conn = op.get_bind()
+    items = sa.table('research_items', sa.column('id', sa.Integer), sa.column(source), sa.column(target))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(items.c.id, items.c[source])
+            .where(items.c.id > last_id, items.c[source].isnot(None))
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            items.update().where(items.c.id == sa.bindparam('_id')).values({target: sa.bindparam('_value')}),
+            [{'_id': row_id, '_value': convert(value)} for row_id, value in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('research_items', sa.Column('embedding_bin', sa.LargeBinary(), nullable=True))
+    _convert_in_batches('embedding', 'embedding_bin', lambda text: encode_embedding(json.loads(text)))
+    with op.batch_alter_table('research_items') as batch_op:
+        batch_op.drop_column('embedding')
+        batch_op.alter_column('embedding_bin', new_column_name='embedding')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('research_items', sa.Column('embedding_text', sa.Text(), nullable=True))
+    _convert_in_batches('embedding', 'embedding_text', lambda blob: json.dumps(decode_embedding(blob, DIMENSION).tolist()))
+    with op.batch_alter_table('research_items') as batch_op:
+        batch_op.drop_column('embedding')
+        batch_op.alter_column('embedding_text', new_column_name='embedding')
@@ -0,0 +1,70 @@
+"""Normalize stored embeddings to unit length for cosine similarity
+
+Revision ID: a4c19e7d5f30
+Revises: 5b7e0d3f2c81
+Create Date: 2025-03-24 09:12:48.731550
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+
+from embeddings import EMBEDDING_DIMENSION, encode_embedding, decode_embedding, normalize_embeddings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c19e7d5f30'
+down_revision: Union[str, None] = '5b7e0d3f2c81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    items = sa.table('research_items', sa.column('id', sa.Integer), sa.column('project_id', sa.Integer), sa.column('embedding', sa.LargeBinary))
+    projects = sa.table('projects', sa.column('id', sa.Integer), sa.column('centroid', sa.LargeBinary), sa.column('item_count', sa.Integer))
+
+    # Rewrite every stored vector at unit length (keeping its stored precision) and
+    # rebuild project centroids as the mean of the normalized vectors.
+    sums, counts = {}, {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(items.c.id, items.c.project_id, items.c.embedding)
+            .where(items.c.id > last_id, items.c.embedding.isnot(None))
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, project_id, embedding in rows:
+            dtype = np.dtype(np.float16) if len(embedding) == EMBEDDING_DIMENSION * 2 else np.dtype(np.float32)
+            vector = normalize_embeddings(decode_embedding(embedding))
+            updates.append({'_id': row_id, '_embedding': encode_embedding(vector, dtype)})
+            if project_id is not None:
+                sums[project_id] = sums.get(project_id, 0) + vector.astype(np.float64)
+                counts[project_id] = counts.get(project_id, 0) + 1
+        conn.execute(
+            items.update().where(items.c.id == sa.bindparam('_id')).values(embedding=sa.bindparam('_embedding')),
+            updates,
+        )
+        last_id = rows[-1][0]
+
+    if sums:
+        conn.execute(
+            projects.update().where(projects.c.id == sa.bindparam('_id')).values(centroid=sa.bindparam('_centroid'), item_count=sa.bindparam('_count')),
+            [{'_id': pid, '_centroid': encode_embedding(sums[pid] / counts[pid], np.dtype(np.float32)), '_count': counts[pid]} for pid in sums],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Original vector magnitudes are not recoverable; normalized vectors remain valid embeddings.
+    pass
@@ -0,0 +1,69 @@
+"""Mirror research item embeddings into a pgvector table on PostgreSQL
+
+Revision ID: c82f5a1e9d03
+Revises: e71b3c9d4a26
+Create Date: 2025-03-26 10:41:55.372018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from embeddings import EMBEDDING_DIMENSION, decode_embedding
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c82f5a1e9d03'
+down_revision: Union[str, None] = 'e71b3c9d4a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _pgvector_available(conn):
+    if conn.dialect.name != 'postgresql':
+        return False
+    return conn.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")).first() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    # SQLite, or PostgreSQL without the extension installed: database search uses an exact scan instead
+    if not _pgvector_available(conn):
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    op.execute(
+        f'CREATE TABLE research_item_vectors ('
+        f'item_id INTEGER PRIMARY KEY REFERENCES research_items (id) ON DELETE CASCADE, '
+        f'embedding vector({EMBEDDING_DIMENSION}) NOT NULL)'
+    )
+
+    items = sa.table('research_items', sa.column('id', sa.Integer), sa.column('embedding', sa.LargeBinary))
+    insert = sa.text('INSERT INTO research_item_vectors (item_id, embedding) VALUES (:item_id, CAST(:embedding AS vector))')
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(items.c.id, items.c.embedding)
+            .where(items.c.id > last_id, items.c.embedding.isnot(None))
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(insert, [
+            {'item_id': row_id, 'embedding': '[' + ','.join(f'{x:.7g}' for x in decode_embedding(blob)) + ']'}
+            for row_id, blob in rows
+        ])
+        last_id = rows[-1][0]
+
+    # Built after the backfill, which is much faster than maintaining it row by row
+    op.execute('CREATE INDEX ix_research_item_vectors_embedding ON research_item_vectors USING hnsw (embedding vector_cosine_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TABLE IF EXISTS research_item_vectors')
@@ -0,0 +1,46 @@
+"""Canonicalize stored research item URLs
+
+Revision ID: d5a8e2f41c67
+Revises: c82f5a1e9d03
+Create Date: 2025-03-27 11:20:36.514208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from dedup import canonicalize_url
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8e2f41c67'
+down_revision: Union[str, None] = 'c82f5a1e9d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    items = sa.table('research_items', sa.column('id', sa.Integer), sa.column('url', sa.String))
+
+    # Rewrite each URL in canonical form so ingest dedup matches it however a page is linked.
+    # Where several rows share a canonical URL, the oldest takes it and the others keep theirs
+    # (the url column is unique; merging them would also mean merging their vectors).
+    rows = conn.execute(sa.select(items.c.id, items.c.url).order_by(items.c.id)).fetchall()
+    taken = {url for _, url in rows}
+    updates = []
+    for row_id, url in rows:
+        canonical = canonicalize_url(url)
+        if canonical != url and canonical not in taken:
+            taken.add(canonical)
+            updates.append({'_id': row_id, '_url': canonical})
+    if updates:
+        conn.execute(items.update().where(items.c.id == sa.bindparam('_id')).values(url=sa.bindparam('_url')), updates)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The original spellings are not kept; canonical URLs still open the same pages.
+    pass
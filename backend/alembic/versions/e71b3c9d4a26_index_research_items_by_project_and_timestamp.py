@@ -0,0 +1,27 @@
+"""Index research_items by (project_id, timestamp) for paginated project listings
+
+Revision ID: e71b3c9d4a26
+Revises: a4c19e7d5f30
+Create Date: 2025-03-25 14:03:17.208914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e71b3c9d4a26'
+down_revision: Union[str, None] = 'a4c19e7d5f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_research_items_project_id_timestamp', 'research_items', ['project_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_research_items_project_id_timestamp', table_name='research_items')
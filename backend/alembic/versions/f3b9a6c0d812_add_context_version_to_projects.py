@@ -0,0 +1,29 @@
+"""Add context_version to projects
+
+Revision ID: f3b9a6c0d812
+Revises: d5a8e2f41c67
+Create Date: 2025-03-28 09:42:11.306845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9a6c0d812'
+down_revision: Union[str, None] = 'd5a8e2f41c67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('projects', sa.Column('context_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('context_version')
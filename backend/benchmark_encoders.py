@@ -0,0 +1,71 @@
+"""Compare embedding backends on throughput and on how well they preserve nearest neighbours.
+
+    python benchmark_encoders.py --candidate onnx --reference sentence_transformers
+
+Texts are the saved research items' "title url" strings (as ingestion embeds them), topped up with
+synthetic titles when the database holds fewer than --samples.
+"""
+import time
+import argparse
+import numpy as np
+
+from database import SessionLocal
+from models import ResearchItem
+from embeddings import normalize_embeddings
+from encoders import EMBEDDING_MODEL, get_encoder
+
+
+def load_texts(samples):
+    db = SessionLocal()
+    try:
+        rows = db.query(ResearchItem.title, ResearchItem.url).limit(samples).all()
+    finally:
+        db.close()
+    texts = [f"{title} {url}" for title, url in rows]
+    topics = ["market trends", "neural networks", "tax law", "climate data", "supply chains", "protein folding"]
+    while len(texts) < samples:
+        i = len(texts)
+        texts.append(f"Notes on {topics[i % len(topics)]} part {i} https://example.com/{i}")
+    return texts
+
+
+def measure(encoder, texts, batch_size, repeats):
+    """Best-of-`repeats` throughput (texts/s) and the (normalized) embeddings."""
+    encoder.load()
+    encoder.encode(texts[:batch_size], batch_size)  # Warm-up: first-run allocations and kernel selection
+    best, vectors = 0.0, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = encoder.encode(texts, batch_size)
+        best = max(best, len(texts) / (time.perf_counter() - start))
+    return best, normalize_embeddings(vectors)
+
+
+def neighbour_recall(reference, candidate, k):
+    """Mean overlap of each text's top-k neighbours under the two embeddings (1.0 = identical rankings)."""
+    k = min(k, len(reference) - 1)
+    truth = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+    found = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:k + 1]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reference", default="sentence_transformers")
+    parser.add_argument("--candidate", default="onnx")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts = load_texts(args.samples)
+    reference_rate, reference = measure(get_encoder(args.reference, args.model), texts, args.batch_size, args.repeats)
+    candidate_rate, candidate = measure(get_encoder(args.candidate, args.model), texts, args.batch_size, args.repeats)
+
+    print(f"📊 {len(texts)} texts, batch size {args.batch_size}")
+    print(f"   {args.reference:>22}: {reference_rate:8.1f} texts/s")
+    print(f"   {args.candidate:>22}: {candidate_rate:8.1f} texts/s ({candidate_rate / reference_rate:.2f}x)")
+    print(f"   mean cosine to reference: {np.mean(np.sum(reference * candidate, axis=1)):.4f}")
+    print(f"   recall@{args.k} of reference neighbours: {neighbour_recall(reference, candidate, args.k):.4f}")
@@ -0,0 +1,166 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session, attributes
+
+from models import Project, ResearchItem
+
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "128"))  # Projects kept serialized
+MMR_DIVERSITY = float(os.getenv("CHAT_CONTEXT_MMR_DIVERSITY", "0.3"))  # 0 = pure relevance, 1 = pure novelty
+CHARS_PER_TOKEN = 4  # Rough tokenizer-agnostic estimate
+
+
+class ChatContextCache:
+    """Serialized /chat_context payloads per project, keyed by the project's `context_version`.
+
+    The version lives on the projects row and is bumped in the same transaction as every change to the
+    project's items (see `bump_context_versions`), so all workers agree on it: ETags derived from it
+    are the same in every process and across restarts, and a cached payload is served only while the
+    version it was built at is still the current one.
+    """
+
+    def __init__(self, max_entries=CHAT_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # project_id -> (version, body)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(project_id, version):
+        return f'W/"ctx-{project_id}-{version}"'
+
+    def get(self, project_id, version):
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(project_id)
+            return entry[1]
+
+    def put(self, project_id, version, body):
+        """Store `body` as the payload of `version`, unless a newer one is already cached."""
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is not None and entry[0] > version:
+                return
+            self._entries[project_id] = (version, body)
+            self._entries.move_to_end(project_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def bump_context_versions(connection, project_ids):
+    """Mark these projects' chat context changed for every worker, in the caller's transaction.
+
+    One atomic UPDATE per project, in id order so concurrent writers cannot deadlock.
+    """
+    projects = Project.__table__
+    for project_id in sorted({project_id for project_id in project_ids if project_id is not None}):
+        connection.execute(
+            update(projects).where(projects.c.id == project_id).values(context_version=projects.c.context_version + 1)
+        )
+
+
+def stream_chat_context(db, project_id, project_name, on_complete=None, batch_size=500):
+    """Yield the chat context JSON for a project piece by piece, reading only the columns it needs."""
+    chunks = [f'{{"project_name": {json.dumps(project_name)}, "research_summary": ['.encode()]
+    yield chunks[0]
+
+    rows = (
+        db.query(ResearchItem.title, ResearchItem.url, ResearchItem.timestamp)
+        .filter(ResearchItem.project_id == project_id)
+        .order_by(ResearchItem.id)
+        .yield_per(batch_size)
+    )
+    separator = b""
+    for title, url, timestamp in rows:
+        chunk = separator + json.dumps(
+            {"title": title or "", "url": url or "", "timestamp": timestamp.isoformat() if timestamp else ""}
+        ).encode()
+        chunks.append(chunk)
+        yield chunk
+        separator = b", "
+
+    chunks.append(b"]}")
+    yield chunks[-1]
+    if on_complete is not None:
+        on_complete(b"".join(chunks))
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def mmr_order(query, vectors, diversity=MMR_DIVERSITY):
+    """Order candidates by maximal marginal relevance: relevant to `query`, dissimilar to those already picked.
+
+    `query` and the rows of `vectors` must be unit length, so dot products are cosine similarities.
+    """
+    if not len(vectors):
+        return []
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    redundancy = np.full(len(vectors), -np.inf)
+    remaining = np.ones(len(vectors), dtype=bool)
+    order = []
+    for _ in range(len(vectors)):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0)
+        scores = np.where(remaining, (1 - diversity) * relevance - diversity * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+def build_ranked_context(project_name, candidates, query, token_budget, diversity=MMR_DIVERSITY):
+    """Chat context holding the most relevant, mutually diverse items that fit in `token_budget`.
+
+    `candidates` are (row, score, vector) triples from a vector search within the project.
+    """
+    context = {"project_name": project_name, "research_summary": []}
+    used = estimate_tokens(json.dumps(context))
+    vectors = np.array([vector for _, _, vector in candidates], dtype=np.float32).reshape(len(candidates), -1)
+
+    for position in mmr_order(query, vectors, diversity):
+        row, score, _ = candidates[position]
+        entry = {
+            "title": row.title or "",
+            "url": row.url or "",
+            "timestamp": row.timestamp.isoformat() if row.timestamp else "",
+            "score": round(score, 4),
+        }
+        cost = estimate_tokens(json.dumps(entry))
+        if used + cost > token_budget:
+            continue  # A shorter item further down may still fit
+        context["research_summary"].append(entry)
+        used += cost
+
+    context["tokens_used"] = used
+    context["token_budget"] = token_budget
+    return context
+
+
+# ✅ Per-process cache; versions are bumped whenever a research item is added to, moved between or removed from projects
+chat_context_cache = ChatContextCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_projects(session, flush_context):
+    changed = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, ResearchItem):
+            changed.add(obj.project_id)
+        elif isinstance(obj, Project):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, ResearchItem):
+            history = attributes.get_history(obj, "project_id")
+            changed.update(history.deleted or ())
+            changed.add(obj.project_id)
+        elif isinstance(obj, Project):
+            changed.add(obj.id)
+    # Same transaction as the change itself: a rollback undoes the bump too
+    bump_context_versions(session.connection(), changed)
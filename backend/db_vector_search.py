@@ -0,0 +1,118 @@
+import os
+import heapq
+import logging
+import numpy as np
+from sqlalchemy import inspect, text
+
+from models import ResearchItem
+from embeddings import decode_embeddings
+
+logger = logging.getLogger(__name__)
+
+# ✅ Where /search runs: "faiss" (in-process index) or "database" (pgvector on PostgreSQL, exact scan elsewhere)
+VECTOR_SEARCH_ENGINE = os.getenv("VECTOR_SEARCH_ENGINE", "faiss")
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "64"))
+SCAN_BATCH_SIZE = 5000
+
+VECTORS_TABLE = "research_item_vectors"  # Created by migration c82f5a1e9d03 when pgvector is available
+
+# Engine -> whether it has the pgvector table, checked once per engine
+_pgvector_engines = {}
+
+
+def pgvector_enabled(db):
+    """True when `db` is PostgreSQL with the research_item_vectors table in place."""
+    engine = db.get_bind()
+    if engine not in _pgvector_engines:
+        _pgvector_engines[engine] = engine.dialect.name == "postgresql" and inspect(engine).has_table(VECTORS_TABLE)
+        if engine.dialect.name == "postgresql" and not _pgvector_engines[engine]:
+            logger.warning(f"⚠️ {VECTORS_TABLE} is missing; database search falls back to an exact scan")
+    return _pgvector_engines[engine]
+
+
+def vector_literal(vector):
+    """pgvector's text form, so vectors can be bound without the pgvector Python package."""
+    return "[" + ",".join(f"{x:.7g}" for x in np.asarray(vector, dtype=np.float32)) + "]"
+
+
+def store_vectors(db, item_ids, vectors):
+    """Mirror unit-length item embeddings into pgvector within the caller's transaction (no-op elsewhere)."""
+    if not len(item_ids) or not pgvector_enabled(db):
+        return
+    db.execute(
+        text(
+            f"INSERT INTO {VECTORS_TABLE} (item_id, embedding) VALUES (:item_id, CAST(:embedding AS vector)) "
+            "ON CONFLICT (item_id) DO UPDATE SET embedding = EXCLUDED.embedding"
+        ),
+        [{"item_id": int(item_id), "embedding": vector_literal(vector)} for item_id, vector in zip(item_ids, vectors)],
+    )
+
+
+def search(db, query, k, project_id=None, since=None, until=None, min_score=None):
+    """Top-k (item_id, cosine score) pairs for a unit-length query, best first, computed inside the database."""
+    if pgvector_enabled(db):
+        return _search_pgvector(db, query, k, project_id, since, until, min_score)
+    return _search_scan(db, query, k, project_id, since, until, min_score)
+
+
+def _search_pgvector(db, query, k, project_id, since, until, min_score):
+    conditions, params = [], {"query": vector_literal(query), "k": k}
+    if project_id is not None:
+        conditions.append("r.project_id = :project_id")
+        params["project_id"] = project_id
+    if since is not None:
+        conditions.append("r.timestamp >= :since")
+        params["since"] = since
+    if until is not None:
+        conditions.append("r.timestamp < :until")
+        params["until"] = until
+    if min_score is not None:
+        conditions.append("v.embedding <=> CAST(:query AS vector) < :max_distance")
+        params["max_distance"] = 1 - min_score
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # The HNSW index only yields ef_search candidates before filtering, so widen it to at least k
+    db.execute(text("SELECT set_config('hnsw.ef_search', :ef, true)"), {"ef": str(max(k, PGVECTOR_EF_SEARCH))})
+    rows = db.execute(
+        text(
+            f"SELECT v.item_id, 1 - (v.embedding <=> CAST(:query AS vector)) AS score "
+            f"FROM {VECTORS_TABLE} v JOIN research_items r ON r.id = v.item_id {where} "
+            f"ORDER BY v.embedding <=> CAST(:query AS vector) LIMIT :k"
+        ),
+        params,
+    )
+    return [(item_id, float(score)) for item_id, score in rows]
+
+
+def _search_scan(db, query, k, project_id, since, until, min_score):
+    """Exact search over the stored embeddings, a batch at a time (SQLite, or PostgreSQL without pgvector)."""
+    query = np.asarray(query, dtype=np.float32)
+    rows = db.query(ResearchItem.id, ResearchItem.embedding).filter(ResearchItem.embedding.isnot(None))
+    if project_id is not None:
+        rows = rows.filter(ResearchItem.project_id == project_id)
+    if since is not None:
+        rows = rows.filter(ResearchItem.timestamp >= since)
+    if until is not None:
+        rows = rows.filter(ResearchItem.timestamp < until)
+
+    best = []  # Min-heap of (score, item_id) holding the top k so far
+    batch = []
+
+    def score_batch():
+        scores = decode_embeddings([blob for _, blob in batch], len(query)) @ query
+        for (item_id, _), score in zip(batch, scores):
+            if min_score is not None and score <= min_score:
+                continue
+            if len(best) < k:
+                heapq.heappush(best, (float(score), item_id))
+            elif score > best[0][0]:
+                heapq.heapreplace(best, (float(score), item_id))
+        batch.clear()
+
+    for row in rows.yield_per(SCAN_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= SCAN_BATCH_SIZE:
+            score_batch()
+    if batch:
+        score_batch()
+    return [(item_id, score) for score, item_id in sorted(best, reverse=True)]
@@ -0,0 +1,145 @@
+import os
+import re
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import numpy as np
+
+# ✅ Query parameters that only track where a click came from; dropped when canonicalizing URLs
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "igshid", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "mkt_tok", "spm", "cmpid", "s_cid",
+} | {param.strip().lower() for param in os.getenv("URL_TRACKING_PARAMS", "").split(",") if param.strip()}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+# Generic names that are tracking only on these sites (and their subdomains); elsewhere they can select content
+HOST_TRACKING_PARAMS = {
+    "youtube.com": {"si", "feature", "pp"},
+    "youtu.be": {"si", "feature"},
+    "open.spotify.com": {"si", "context"},
+    "twitter.com": {"ref_src", "ref_url", "s", "t"},
+    "x.com": {"ref_src", "ref_url", "s", "t"},
+    "linkedin.com": {"trk", "trackingid", "refid"},
+    "amazon.com": {"ref", "ref_", "tag", "psc"},
+    "medium.com": {"source"},
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# ✅ Near-duplicates: the same page (see same_page) with cosine similarity to an indexed item at least
+# NEAR_DUPLICATE_MIN_SCORE *and* title SimHashes at most SIMHASH_MAX_DISTANCE bits apart (either signal
+# alone gives false positives, and both together still match distinct pages with generic titles)
+NEAR_DUPLICATE_MIN_SCORE = float(os.getenv("NEAR_DUPLICATE_MIN_SCORE", "0.92"))
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+NEAR_DUPLICATE_CANDIDATES = int(os.getenv("NEAR_DUPLICATE_CANDIDATES", "4"))  # Nearest saved items checked per new item
+# Query values that select a record ("?id=42", "?v=dQw4w9WgXcQ"): digits, or long opaque tokens
+ID_VALUE = re.compile(r"\d|^[A-Za-z0-9_-]{11,}$")
+
+
+def canonicalize_url(url):
+    """Canonical form of a URL, so one page opened through different links is saved once.
+
+    Lowercases the scheme and host, drops "www.", default ports, tracking parameters and trailing
+    slashes, and sorts the remaining query parameters. Fragments are dropped unless they look like a
+    client-side route ("#/route", "#!/page", Gmail's "#inbox/<id>"), which selects a different page
+    in hash-routed apps.
+    Non-http(s) URLs are returned as-is.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username:
+        host = f"{parts.username}{':' + parts.password if parts.password else ''}@{host}"
+
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    site_params = set().union(*(
+        params for site, params in HOST_TRACKING_PARAMS.items()
+        if parts.hostname.lower() == site or parts.hostname.lower().endswith("." + site)
+    ))
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS | site_params and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) or "/" in parts.fragment else ""
+    return urlunsplit((scheme, host, path, urlencode(query), fragment))
+
+
+def same_page(url, other_url):
+    """Whether two canonical URLs can be the same page: same host, path and route fragment, and the same
+    id-like query values.
+
+    Other query parameters may differ (an untracked "?ref=", "?lang="), since those rarely select
+    a different record; "New chat" conversations, "Untitled document" docs or same-titled job
+    postings differ in a path segment or id parameter and are always distinct.
+    """
+    parts, other = urlsplit(url), urlsplit(other_url)
+    if (parts.netloc, parts.path, parts.fragment) != (other.netloc, other.path, other.fragment):
+        return False
+
+    def ids(query):
+        return sorted((key, value) for key, value in parse_qsl(query, keep_blank_values=True) if ID_VALUE.search(value))
+
+    return ids(parts.query) == ids(other.query)
+
+
+def _features(text):
+    words = re.findall(r"\w+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def simhash(text):
+    """64-bit SimHash of a title's words and word pairs; similar titles differ in few bits."""
+    features = _features(text)
+    if not features:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big") for feature in features],
+        dtype=np.uint64,
+    )
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.astype(np.int64).sum(axis=0) * 2 - len(features)
+    return int(sum(1 << i for i in np.flatnonzero(votes > 0)))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def is_near_duplicate(title, url, other_title, other_url, score):
+    """Whether two items (canonical URLs) whose embeddings have cosine similarity `score` are the same page."""
+    return (
+        score >= NEAR_DUPLICATE_MIN_SCORE
+        and same_page(url, other_url)
+        and hamming(simhash(title), simhash(other_title)) <= SIMHASH_MAX_DISTANCE
+    )
+
+
+def collapse_batch(titles, urls, embeddings):
+    """For each item, the position of an earlier near-duplicate in the same batch, or None.
+
+    `embeddings` are unit-length, so the batch's pairwise cosine similarities are one matrix product.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    duplicate_of = [None] * len(titles)
+    if len(titles) < 2:
+        return duplicate_of
+    scores = embeddings @ embeddings.T
+    hashes = [simhash(title) for title in titles]
+    for i in range(1, len(titles)):
+        for j in np.flatnonzero(scores[i, :i] >= NEAR_DUPLICATE_MIN_SCORE):
+            if duplicate_of[j] is None and same_page(urls[i], urls[j]) and hamming(hashes[i], hashes[j]) <= SIMHASH_MAX_DISTANCE:
+                duplicate_of[i] = int(j)
+                break
+    return duplicate_of
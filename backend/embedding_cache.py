@@ -0,0 +1,138 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ✅ Cache sizing (bytes of vectors kept in memory) and optional on-disk tier ("" disables it)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+
+
+def cache_key(model_name, text):
+    """Content hash of the whitespace-normalized text, namespaced by the model that embeds it."""
+    normalized = " ".join(text.split())
+    return hashlib.sha1(f"{model_name}\0{normalized}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """Byte-bounded LRU of embeddings keyed by content hash, optionally backed by a sqlite file.
+
+    Memory misses fall through to the disk tier (when configured) before the caller has to
+    run the model; everything computed is written to both tiers.
+    """
+
+    def __init__(self, max_bytes=EMBEDDING_CACHE_MAX_BYTES, disk_path=EMBEDDING_CACHE_PATH):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.disk_path = disk_path
+        self._disk = None  # Opened on first use so importing the cache touches no files
+
+    def _disk_tier(self):
+        """The sqlite connection, or None without a disk tier. Called with the lock held."""
+        if self._disk is None and self.disk_path:
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._disk.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._disk.commit()
+        return self._disk
+
+    # ------------------------------------------------------------------ memory tier
+
+    def _remember(self, key, vector):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+            self.hits += len(found)
+
+            missing = [key for key in keys if key not in found]
+            disk = self._disk_tier() if missing else None
+            if disk is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = disk.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            disk = self._disk_tier()
+            if disk is not None:
+                disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in items],
+                )
+                disk.commit()
+
+    # ------------------------------------------------------------------ public API
+
+    def get_many(self, model_name, texts, compute):
+        """Return embeddings for `texts`, calling `compute(missing_texts)` once for every cache miss."""
+        keys = [cache_key(model_name, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            vectors = np.asarray(compute(list(missing.values())), dtype=np.float32)
+            computed = [(key, np.ascontiguousarray(vector)) for key, vector in zip(missing, vectors)]
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def get(self, model_name, text, compute):
+        """Single-text form of get_many; `compute` takes one text and returns one vector."""
+        return self.get_many(model_name, [text], lambda missing: [compute(missing[0])])[0]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+# ✅ Shared by every embedding call site in the process
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ✅ Micro-batching: concurrent requests are coalesced into one encode call of up to EMBED_MAX_BATCH_SIZE
+# texts, waiting at most EMBED_MAX_WAIT_MS after the oldest request for others to arrive
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+WAIT_SAMPLES = 1024  # Recent queue waits kept for percentiles
+
+
+class EmbeddingDispatcher:
+    """Coalesces concurrent `encode` requests into shared model calls and fans the rows back out.
+
+    The batch window is measured from when the oldest request was queued, so under load (a backlog
+    built up while the previous batch ran) batches go out immediately, full; when idle, a lone
+    request waits at most `max_wait_ms` for company.
+    """
+
+    def __init__(self, encode, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()  # (texts, future, queued_at)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.failures = 0
+        self.encode_seconds = 0.0
+        self.batch_sizes = Counter()  # Power-of-two bucket -> batches
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def submit(self, texts):
+        """Queue `texts`; the returned Future resolves to their (len(texts), dimension) float32 rows."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:  # Started on first use so importing has no side effects
+                    self._thread = threading.Thread(target=self._run, name="embedding-dispatcher", daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future
+
+    def encode(self, texts, batch_size=None):
+        """Blocking form of submit(); `batch_size` is accepted for Encoder compatibility and ignored."""
+        texts = list(texts)
+        if not texts:
+            return self._encode(texts, self.max_batch_size)
+        return self.submit(texts).result()
+
+    def _run(self):
+        carry = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            batch, size = [first], len(first[0])
+            deadline = first[2] + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if size + len(request[0]) > self.max_batch_size:
+                    carry = request  # Would overflow this batch; it opens the next one
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        texts = [text for request_texts, _, _ in batch for text in request_texts]
+        started = time.perf_counter()
+        try:
+            vectors = np.asarray(self._encode(texts, self.max_batch_size), dtype=np.float32)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ Encoding a batch of {len(texts)} texts failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+
+        offset = 0
+        for request_texts, future, _ in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(texts)
+            self.encode_seconds += elapsed
+            self.batch_sizes[1 << (len(texts) - 1).bit_length()] += 1
+            self._waits.extend(started - queued_at for _, _, queued_at in batch)
+
+    def stats(self):
+        with self._lock:
+            waits = np.array(self._waits) * 1000
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "failures": self.failures,
+                "queued": self._queue.qsize(),
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+                "batch_size_histogram": {f"<={size}": count for size, count in sorted(self.batch_sizes.items())},
+                "queue_wait_ms": {
+                    "mean": float(waits.mean()) if len(waits) else 0.0,
+                    "p50": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                    "p95": float(np.percentile(waits, 95)) if len(waits) else 0.0,
+                    "max": float(waits.max()) if len(waits) else 0.0,
+                },
+                "encode_ms_per_batch": self.encode_seconds * 1000 / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
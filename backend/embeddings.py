@@ -0,0 +1,44 @@
+import os
+import numpy as np
+
+from encoders import get_encoder
+
+# ✅ Embedding width produced by the configured encoder (see encoders.py); sizes the index and stored vectors.
+# Known models need no model load; others are probed once, unless EMBEDDING_DIMENSION overrides it.
+EMBEDDING_DIMENSION = get_encoder().dimension
+
+# ✅ Storage precision for ResearchItem.embedding ("float32" or "float16")
+EMBEDDING_DTYPE = np.dtype(os.getenv("EMBEDDING_DTYPE", "float32"))
+
+
+def encode_embedding(vector, dtype=EMBEDDING_DTYPE):
+    """Pack an embedding into raw little-endian bytes for the LargeBinary column."""
+    return np.asarray(vector, dtype=dtype.newbyteorder("<")).tobytes()
+
+
+def _stored_dtype(blob, dimension):
+    # Rows keep whichever precision they were written with; the byte length tells them apart.
+    return np.dtype("<f2") if len(blob) == dimension * 2 else np.dtype("<f4")
+
+
+def decode_embedding(blob, dimension=EMBEDDING_DIMENSION):
+    """Unpack a stored embedding as float32. float32 rows are a zero-copy view over `blob`."""
+    vector = np.frombuffer(blob, dtype=_stored_dtype(blob, dimension))
+    return vector if vector.dtype == np.float32 else vector.astype(np.float32)
+
+
+def decode_embeddings(blobs, dimension=EMBEDDING_DIMENSION):
+    """Unpack a sequence of stored embeddings into one (n, dimension) float32 matrix."""
+    if not blobs:
+        return np.empty((0, dimension), dtype=np.float32)
+    if len({len(blob) for blob in blobs}) > 1:
+        return np.vstack([decode_embedding(blob, dimension) for blob in blobs])
+    matrix = np.frombuffer(b"".join(blobs), dtype=_stored_dtype(blobs[0], dimension)).reshape(len(blobs), dimension)
+    return matrix if matrix.dtype == np.float32 else matrix.astype(np.float32)
+
+
+def normalize_embeddings(vectors):
+    """Return a float32 copy of `vectors` scaled to unit L2 norm, so inner product is cosine similarity."""
+    vectors = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
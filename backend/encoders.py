@@ -0,0 +1,243 @@
+import os
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ✅ Which encoder turns text into embeddings: "sentence_transformers" (PyTorch), "onnx" (ONNX Runtime,
+# int8-quantized by default, for CPU-only hosts) or "ollama" (local Ollama server)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence_transformers")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models/all-MiniLM-L6-v2")  # Written by `python encoders.py export`
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "model_int8.onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = one per physical core
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))  # all-MiniLM-L6-v2 was trained on 256-token inputs
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "0")) or None  # Overrides the model's width (checked at load)
+
+# Output width of models we know, so indexes can be sized without loading the model
+KNOWN_DIMENSIONS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L6-v2": 384,
+    "mistral": 4096,
+}
+
+
+class Encoder:
+    """Turns texts into an (n, dimension) float32 matrix of (not yet normalized) embeddings.
+
+    Models are loaded on first use. `name` namespaces embedding cache keys, so vectors from
+    different backends or models are never mixed up.
+    """
+
+    backend = None
+
+    def __init__(self, model_name, dimension=None):
+        self.model_name = model_name
+        self._dimension = dimension or KNOWN_DIMENSIONS.get(model_name)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return f"{self.backend}/{self.model_name}"
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def dimension(self):
+        if self._dimension is None:
+            self._dimension = len(self.encode(["dimension probe"])[0])
+        return self._dimension
+
+    def load(self):
+        """Load the model now (if it is not already) and check it produces the configured dimension."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    model = self._load()
+                    actual = self._model_dimension(model)
+                    if actual is not None and self._dimension is not None and actual != self._dimension:
+                        raise ValueError(f"{self.name} produces {actual}-d embeddings, but {self._dimension} are configured")
+                    self._dimension = self._dimension or actual
+                    self._model = model
+                    logger.info(f"✅ Loaded {self.name} encoder")
+        return self._model
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        return np.asarray(self._encode(self.load(), texts, batch_size), dtype=np.float32)
+
+    def encode_one(self, text):
+        return self.encode([text])[0]
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _model_dimension(self, model):
+        return None
+
+    def _encode(self, model, texts, batch_size):
+        raise NotImplementedError
+
+
+class SentenceTransformerEncoder(Encoder):
+    """The PyTorch sentence-transformers model."""
+
+    backend = "sentence_transformers"
+
+    @property
+    def name(self):
+        return self.model_name  # Cache keys written before other backends existed carry no prefix
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer  # Importing torch alone takes seconds
+        return SentenceTransformer(self.model_name)
+
+    def _model_dimension(self, model):
+        return model.get_sentence_embedding_dimension()
+
+    def _encode(self, model, texts, batch_size):
+        return model.encode(texts, batch_size=batch_size)
+
+
+class OnnxEncoder(Encoder):
+    """A transformer exported to ONNX (see `export_onnx`) run with ONNX Runtime, mean-pooled like sentence-transformers."""
+
+    backend = "onnx"
+
+    def __init__(self, model_name, dimension=None, model_dir=ONNX_MODEL_DIR, model_file=ONNX_MODEL_FILE):
+        super().__init__(model_name, dimension)
+        self.model_dir = model_dir
+        self.model_file = model_file
+
+    @property
+    def name(self):
+        return f"{self.backend}/{self.model_name}/{self.model_file}"
+
+    def _load(self):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        session = onnxruntime.InferenceSession(
+            os.path.join(self.model_dir, self.model_file), options, providers=["CPUExecutionProvider"]
+        )
+
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=ONNX_MAX_LENGTH)
+        tokenizer.enable_padding()
+        return session, tokenizer
+
+    def _model_dimension(self, model):
+        session, _ = model
+        width = session.get_outputs()[0].shape[-1]
+        return width if isinstance(width, int) else None
+
+    def _encode(self, model, texts, batch_size):
+        session, tokenizer = model
+        input_names = {node.name for node in session.get_inputs()}
+        batches = []
+        # Sorting by length keeps padding (and wasted compute) per batch small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(texts), batch_size):
+            encodings = tokenizer.encode_batch([texts[i] for i in order[start:start + batch_size]])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = session.run(None, {name: value for name, value in inputs.items() if name in input_names})[0]
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+
+        vectors = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        vectors[order] = np.vstack(batches)
+        return vectors
+
+
+class OllamaEncoder(Encoder):
+    """Embeddings from a local Ollama server (one request per text)."""
+
+    backend = "ollama"
+
+    def _load(self):
+        import ollama
+        return ollama
+
+    def _model_dimension(self, model):
+        return len(model.embeddings(self.model_name, "dimension probe")["embedding"])
+
+    def _encode(self, model, texts, batch_size):
+        return [model.embeddings(self.model_name, text)["embedding"] for text in texts]
+
+
+ENCODERS = {
+    SentenceTransformerEncoder.backend: SentenceTransformerEncoder,
+    OnnxEncoder.backend: OnnxEncoder,
+    OllamaEncoder.backend: OllamaEncoder,
+}
+
+
+def get_encoder(backend=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION):
+    """Encoder for `backend`; nothing is loaded until it is first used (or its dimension is unknown and asked for)."""
+    if backend not in ENCODERS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(ENCODERS)}")
+    return ENCODERS[backend](model_name, dimension)
+
+
+def export_onnx(model_name, output_dir, quantize=True):
+    """Export a Hugging Face transformer to ONNX and (by default) quantize its weights to int8.
+
+    Needs torch and transformers, so run it once on a build machine; serving needs only
+    onnxruntime and tokenizers.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)  # Writes tokenizer.json
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["An example research tab title"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embedding encoder tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export an embedding model to (int8-quantized) ONNX")
+    export.add_argument("--model", default=EMBEDDING_MODEL)
+    export.add_argument("--output", default=ONNX_MODEL_DIR)
+    export.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+    path = export_onnx(args.model, args.output, quantize=not args.no_quantize)
+    print(f"✅ Exported {args.model} to {path}")
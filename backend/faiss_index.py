@@ -1,77 +1,65 @@
-import faiss
-import numpy as np
-import json
 import os
 import time
-from datetime import datetime
-import ollama  # Using Mistral-7B for embeddings
-
-# ✅ FAISS Index Setup (1536 dimensions to match OpenAI/Mistral embeddings)
-DIMENSION = 1536
-index = faiss.IndexFlatL2(DIMENSION)
-
-# ✅ Tab Metadata Storage (Store metadata separately)
-TAB_STORAGE_FILE = "tab_metadata.json"
-
-# ✅ Load existing tab metadata if it exists
-if os.path.exists(TAB_STORAGE_FILE):
-    with open(TAB_STORAGE_FILE, "r") as f:
-        tab_metadata = json.load(f)
-else:
-    tab_metadata = {}
-
-# ✅ Function to generate embeddings using local Ollama (Mistral-7B)
+from datetime import datetime, timezone
+from embedding_cache import embedding_cache
+from embeddings import normalize_embeddings
+from encoders import get_encoder
+from dedup import canonicalize_url
+from index_store import tab_id_for_url
+from sharded_index import ShardedIndex
+
+# ✅ Tab encoder: local Ollama (Mistral-7B) unless TAB_ENCODER_BACKEND / TAB_ENCODER_MODEL say otherwise
+encoder = get_encoder(
+    os.getenv("TAB_ENCODER_BACKEND", "ollama"),
+    os.getenv("TAB_ENCODER_MODEL", "mistral"),
+    int(os.getenv("TAB_EMBEDDING_DIMENSION", "0")) or None,
+)
+
+# ✅ FAISS Index Setup, sized to the encoder's output
+# Inner product over L2-normalized vectors, i.e. cosine similarity; keyed by tab id (a stable hash of the
+# URL). Tabs are partitioned into time buckets of TAB_SHARD_HOURS, each its own FAISS index + metadata
+# store (see sharded_index.py), so expiring old tabs drops whole shards and recent-only searches skip the rest.
+DIMENSION = encoder.dimension
+TAB_INDEX_DIR = os.getenv("TAB_INDEX_DIR", "tab_index")
+TAB_TTL_HOURS = float(os.getenv("TAB_TTL_HOURS", "48"))
+tab_index = ShardedIndex(TAB_INDEX_DIR, DIMENSION)
+tab_index.load()
+
+# ✅ Function to generate embeddings with the tab encoder
 def generate_embedding(text):
-    response = ollama.embeddings("mistral", text)
-    return np.array(response["embedding"], dtype=np.float32)
+    return normalize_embeddings(embedding_cache.get(encoder.name, text, encoder.encode_one))
 
 # ✅ Function to add a tab to FAISS and store metadata
 def add_tab(title, url):
-    tab_id = str(hash(url))  # Simple hash for unique ID
-    timestamp = datetime.utcnow().isoformat()
+    url = canonicalize_url(url)  # One record per page, however the tab reached it
+    tab_id = tab_id_for_url(url)
+    now = datetime.now(timezone.utc)
 
     # Generate embedding for title + URL
     embedding_vector = generate_embedding(title + " " + url)
 
-    # Store in FAISS
-    index.add(np.array([embedding_vector]))
-
-    # Store metadata
-    tab_metadata[tab_id] = {"title": title, "url": url, "timestamp": timestamp}
-
-    # Save metadata to JSON
-    with open(TAB_STORAGE_FILE, "w") as f:
-        json.dump(tab_metadata, f)
+    # Store vector + metadata in the current time bucket (replacing any earlier copy of the same tab)
+    metadata = {"title": title, "url": url, "timestamp": now.replace(tzinfo=None).isoformat()}
+    tab_index.add(tab_id, embedding_vector, metadata, now.timestamp())
 
     print(f"✅ Tab added: {title} - {url}")
 
-# ✅ Function to search for similar tabs
-def search_tabs(query, top_k=5):
+# ✅ Function to search for similar tabs (optionally only those opened in the last `since_hours`)
+def search_tabs(query, top_k=5, since_hours=None):
     query_embedding = generate_embedding(query)
-    distances, indices = index.search(np.array([query_embedding]), top_k)
-
-    # Retrieve tab metadata
-    results = []
-    for idx in indices[0]:
-        if idx < len(tab_metadata):
-            tab_id = list(tab_metadata.keys())[idx]
-            results.append(tab_metadata[tab_id])
-
-    return results
+    since = time.time() - since_hours * 3600 if since_hours is not None else None
 
-# ✅ Function to delete old tabs (e.g., after 24-48 hours)
-def cleanup_old_tabs(expiration_hours=48):
-    now = datetime.utcnow()
-    expired_tabs = [tab_id for tab_id, meta in tab_metadata.items()
-                    if (now - datetime.fromisoformat(meta["timestamp"])).total_seconds() > expiration_hours * 3600]
+    # Per-shard top-k merged by score; metadata comes from the shard that matched
+    return [metadata for _, _, metadata in tab_index.search(query_embedding, top_k, since=since)]
 
-    for tab_id in expired_tabs:
-        del tab_metadata[tab_id]  # Remove from metadata
-        print(f"🗑️ Deleted old tab: {tab_id}")
+# ✅ Function to delete old tabs (e.g., after 24-48 hours): drops whole time shards
+def cleanup_old_tabs(expiration_hours=TAB_TTL_HOURS):
+    for shard in tab_index.drop_before(time.time() - expiration_hours * 3600):
+        print(f"🗑️ Deleted old tabs: {len(shard.metadata)} from {shard.label()}")
 
-    # Save updated metadata
-    with open(TAB_STORAGE_FILE, "w") as f:
-        json.dump(tab_metadata, f)
+# ✅ Scheduled retention: run the cleanup every TAB_RETENTION_INTERVAL seconds in the background
+def start_retention(expiration_hours=TAB_TTL_HOURS):
+    tab_index.start_retention(expiration_hours * 3600)
 
 # ✅ Example Usage
 if __name__ == "__main__":
@@ -1,24 +1,38 @@
 import os
 import json
-import time
-import requests
-import hashlib
+import asyncio
+import base64
 import threading
 import subprocess
 import logging
 import numpy as np
-import faiss
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Body
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Body, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
-from typing import List
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import List, Optional
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 
 from database import SessionLocal
-from models import Project, ResearchItem  # Ensure your models include Project
+from models import Project, ResearchItem, lock_projects  # Ensure your models include Project
+from embeddings import EMBEDDING_DIMENSION, encode_embedding, decode_embedding, decode_embeddings, normalize_embeddings
+from index_store import IndexLockedError, tab_id_for_url
+from dedup import NEAR_DUPLICATE_CANDIDATES, NEAR_DUPLICATE_MIN_SCORE, canonicalize_url, collapse_batch, is_near_duplicate
+from vector_state import VectorState, sync_with_orm
+from vector_service import VECTOR_SERVICE_SOCKET, VectorServiceError, remote_vector_state
+from embedding_cache import embedding_cache
+from encoders import EMBEDDING_BACKEND, EMBEDDING_MODEL, get_encoder
+from ingest_worker import INGEST_PROCESSES, IngestWorker
+from tab_diff import TabDiff
+from ingest_leader import IngestLeader, Ingestion
+from chat_context import bump_context_versions, chat_context_cache, stream_chat_context, build_ranked_context
+import db_vector_search
 
 # ✅ Load environment variables
 load_dotenv()
@@ -28,16 +42,42 @@ API_SECRET_KEY = os.getenv("API_SECRET_KEY", "default_key")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# ✅ Initialize FAISS index (Fix for add_with_ids issue)
-DIMENSION = 384
-base_index = faiss.IndexFlatL2(DIMENSION)  # Base index
-index = faiss.IndexIDMap(base_index)  # ID Mapping to allow add_with_ids
+# ✅ Encoder, FAISS index (IndexIDMap keyed by ResearchItem.id, persisted as snapshot + write-ahead
+# log) and the project centroids: owned by this process, or by the vector service
+# shared with every other worker when VECTOR_SERVICE_SOCKET is set. Nothing is loaded at import.
+DIMENSION = EMBEDDING_DIMENSION
+if VECTOR_SERVICE_SOCKET:
+    vector_state = remote_vector_state()
+else:
+    vector_state = VectorState(DIMENSION, get_encoder(dimension=DIMENSION))  # load() fails loudly if the model disagrees
+sync_with_orm(vector_state)  # Committed ORM inserts, deletes, moves and re-embeds update the index
+index, project_router, encoder = vector_state.index, vector_state.project_router, vector_state.encoder
 
 # ✅ Dictionary to store metadata for FAISS embeddings
 stored_metadata = {}
 
+# ✅ Warm up and start background ingestion with the app instead of at import time
+@asynccontextmanager
+async def lifespan(app):
+    if not VECTOR_SERVICE_SOCKET:
+        # Fail fast: a second worker must not open the same snapshot and WAL; the vector service shares one
+        try:
+            index.lock_directory()
+        except IndexLockedError as e:
+            raise RuntimeError(f"{e}; set VECTOR_SERVICE_SOCKET to run several API workers on one index") from e
+    warmup = asyncio.create_task(asyncio.to_thread(warm_up))  # Serve /ready (503) while loading
+    await ingest_leader.start()  # Sweeps in whichever worker wins the election; the others proxy to it
+    try:
+        yield
+    finally:
+        await ingest_leader.stop()
+        await asyncio.gather(warmup, return_exceptions=True)
+        # Never overwrite the snapshot with an index that was not restored; the vector service snapshots its own
+        if index_loaded.is_set() and not VECTOR_SERVICE_SOCKET:
+            index.snapshot()
+
 # ✅ Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 # Sample database of projects
@@ -56,8 +96,6 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# ✅ Load SentenceTransformer model
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
 
 
 # ✅ Dependency to get database session (Move this ABOVE API Endpoints)
@@ -79,17 +117,18 @@ def save_research_item(item_data: dict, db: Session = Depends(get_db)):
     timestamp_str = item_data.get("timestamp", datetime.utcnow().isoformat())  # Default to now if missing
     timestamp = datetime.fromisoformat(timestamp_str)  # Convert to datetime
 
-    # ✅ Check if a research item with the same URL already exists
-    existing_item = db.query(ResearchItem).filter(ResearchItem.url == item_data["url"]).first()
+    # ✅ Check if a research item with the same (canonical) URL already exists
+    url = canonicalize_url(item_data["url"])
+    existing_id = find_saved_urls(db, {url: {item_data["url"]}}).get(url)
 
-    if existing_item:
-        return {"message": "Research item already exists", "id": existing_item.id}
+    if existing_id is not None:
+        return {"message": "Research item already exists", "id": existing_id}
 
     try:
         # ✅ Create new research item
         new_research_item = ResearchItem(
             title=item_data["title"],
-            url=item_data["url"],
+            url=url,
             project_id=item_data["project_id"],
             timestamp=timestamp  # ✅ Pass as a datetime object
         )
@@ -104,50 +143,314 @@ def save_research_item(item_data: dict, db: Session = Depends(get_db)):
         db.rollback()  # ✅ Rollback transaction if error occurs
         return {"error": "This research item already exists."}
 
+# ✅ Bulk ingest: chunked INSERT ... ON CONFLICT (url) DO NOTHING with batched embedding
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+async def iter_bulk_items(request):
+    """Yields items from an NDJSON stream (one object per line) or a JSON array / {"items": [...]} body."""
+    if "ndjson" in request.headers.get("content-type", ""):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    else:
+        body = await request.json()
+        for item in body if isinstance(body, list) else body.get("items", []):
+            yield item
+
+
+def save_research_chunk(db, raw_items, embed=True, known_projects=None):
+    """Saves one chunk of bulk items with a single upsert and indexes their vectors; returns per-item results.
+
+    `known_projects` (project id -> exists) carries project lookups across the chunks of one request.
+    """
+    results = [None] * len(raw_items)
+    known_projects = {} if known_projects is None else known_projects
+    parsed = []  # (position, row, submitted url)
+    for position, raw in enumerate(raw_items):
+        try:
+            item = json.loads(raw) if isinstance(raw, (bytes, str)) else raw
+            url = canonicalize_url(item["url"])
+            row = {
+                "title": item["title"],
+                "url": url,
+                "project_id": int(item["project_id"]),
+                "timestamp": datetime.fromisoformat(item["timestamp"]) if item.get("timestamp") else datetime.utcnow(),
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            results[position] = {"status": "error", "detail": f"Invalid item: {e}"}
+            continue
+        parsed.append((position, row, item["url"]))
+
+    # ✅ Look up each project once per request, so unknown ones fail per item instead of on the foreign key
+    unchecked = list({row["project_id"] for _, row, _ in parsed} - set(known_projects))
+    if unchecked:
+        found = {project_id for (project_id,) in db.query(Project.id).filter(Project.id.in_(unchecked))}
+        known_projects.update((project_id, project_id in found) for project_id in unchecked)
+
+    candidates = {}  # canonical url -> (position, row)
+    spellings = {}  # canonical url -> URLs as submitted
+    for position, row, submitted_url in parsed:
+        url = row["url"]
+        if not known_projects[row["project_id"]]:
+            results[position] = {"url": url, "status": "error", "detail": f"Project {row['project_id']} not found"}
+            continue
+        spellings.setdefault(url, set()).add(submitted_url)
+        if url in candidates:
+            results[position] = {"url": url, "status": "duplicate"}  # Same page earlier in this chunk
+            continue
+        candidates[url] = (position, row)
+
+    # ✅ Skip URLs that are already saved before spending any model time on them
+    existing = find_saved_urls(db, spellings)
+    new_rows = [row for url, (_, row) in candidates.items() if url not in existing]
+
+    embeddings = np.empty((0, DIMENSION), dtype=np.float32)
+    duplicate_ids = {}  # url -> saved item it near-duplicates
+    duplicate_rows = {}  # url -> url of an earlier row in this chunk it near-duplicates
+    if embed and new_rows:
+        embeddings = generate_embeddings([f"{row['title']} {row['url']}" for row in new_rows])
+
+        # ✅ Collapse near-duplicates into the saved (or first new) copy of the page
+        saved, earlier = find_near_duplicates(db, [row["title"] for row in new_rows], [row["url"] for row in new_rows], embeddings)
+        for i, row in enumerate(new_rows):
+            if saved[i] is not None:
+                duplicate_ids[row["url"]] = saved[i]
+            elif earlier[i] is not None:
+                duplicate_rows[row["url"]] = new_rows[earlier[i]]["url"]
+        kept = [i for i, row in enumerate(new_rows) if row["url"] not in duplicate_ids and row["url"] not in duplicate_rows]
+        new_rows, embeddings = [new_rows[i] for i in kept], embeddings[kept]
+
+        for row, embedding in zip(new_rows, embeddings):
+            row["embedding"] = encode_embedding(embedding)
+
+    inserted = {}
+    if new_rows:
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        statement = (
+            dialect.insert(ResearchItem.__table__)
+            .values([{"embedding": None, **row} for row in new_rows])
+            .on_conflict_do_nothing(index_elements=["url"])
+            .returning(ResearchItem.id, ResearchItem.url)
+        )
+        inserted = {url: item_id for item_id, url in db.execute(statement)}
+
+        # Core inserts bypass the ORM flush hook, so fold the new vectors into project centroids here
+        if embed:
+            by_project = {}
+            for row, embedding in zip(new_rows, embeddings):
+                if row["url"] in inserted:
+                    by_project.setdefault(row["project_id"], []).append(embedding)
+            for project_id, project in lock_projects(db, by_project).items():
+                project.fold_embeddings(by_project[project_id])
+            db_vector_search.store_vectors(
+                db,
+                [inserted[row["url"]] for row in new_rows if row["url"] in inserted],
+                [embedding for row, embedding in zip(new_rows, embeddings) if row["url"] in inserted],
+            )
+        bump_context_versions(db.connection(), {row["project_id"] for row in new_rows if row["url"] in inserted})
+        db.commit()
+
+        # ✅ Index the chunk as soon as it is committed, so a later failing chunk cannot strand it outside
+        # FAISS and the next chunk's near-duplicate check sees it
+        if embed:
+            added = [(i, row) for i, row in enumerate(new_rows) if row["url"] in inserted]
+            if added:
+                vector_state.add(
+                    [(inserted[row["url"]], row["project_id"]) for _, row in added],
+                    embeddings[[i for i, _ in added]],
+                )
+
+        # Rows that lost a race with a concurrent insert already exist
+        lost = [row["url"] for row in new_rows if row["url"] not in inserted]
+        if lost:
+            existing.update(db.query(ResearchItem.url, ResearchItem.id).filter(ResearchItem.url.in_(lost)))
+
+    for url, (position, row) in candidates.items():
+        if url in inserted:
+            results[position] = {"url": url, "id": inserted[url], "status": "created"}
+        elif url in duplicate_ids or url in duplicate_rows:
+            kept_url = duplicate_rows.get(url)
+            duplicate_of = duplicate_ids.get(url) or inserted.get(kept_url) or existing.get(kept_url)
+            results[position] = {"url": url, "id": duplicate_of, "status": "near_duplicate"}
+        else:
+            results[position] = {"url": url, "id": existing.get(url), "status": "exists"}
+    return results
+
+
+@app.post("/save_research_items/bulk")
+async def save_research_items_bulk(request: Request, embed: bool = True, db: Session = Depends(get_db)):
+    """Save many research items, deduplicated by canonical URL and near-duplicate content. Accepts a JSON array or a streamed NDJSON body."""
+    # Restore the index before adding rows, or its consistency check would index them a second time
+    await run_in_threadpool(ensure_index_loaded)
+    results, chunk, known_projects = [], [], {}
+
+    async def flush():
+        results.extend(await run_in_threadpool(save_research_chunk, db, list(chunk), embed, known_projects))
+        chunk.clear()
+
+    async for item in iter_bulk_items(request):
+        chunk.append(item)
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "total": len(results), "items": results}
+
+
 # ✅ Endpoint to retrieve all projects
 @app.get("/get_projects/")
 def get_projects(db: Session = Depends(get_db)):
     logger.info("🔍 get_projects() called!")  # Debugging line
-    projects = db.query(Project).all()
-    return {"projects": [{"id": proj.id, "name": proj.name} for proj in projects]}
+    projects = db.query(Project.id, Project.name).order_by(Project.id).all()
+    return {"projects": [{"id": project_id, "name": name} for project_id, name in projects]}
+
 
 
+CHAT_CONTEXT_CANDIDATES = int(os.getenv("CHAT_CONTEXT_CANDIDATES", "50"))  # Vector hits considered per query
 
 @app.get("/chat_context/{project_id}")
-async def get_chat_context(project_id: int, db: Session = Depends(get_db)):
-    """Fetch project context for LibreChat conversations"""
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+def get_chat_context(project_id: int, request: Request, query: Optional[str] = None, token_budget: int = 1500):
+    """Fetch project context for LibreChat conversations.
+
+    With `query`, returns only the project's items most relevant to it (diversified with MMR) that fit
+    in `token_budget` tokens. Without it, returns every item: served from a per-project cache when
+    unchanged, streamed from the DB otherwise; clients that send the last ETag in If-None-Match get a
+    304 while the project's research items are unchanged.
+    """
+    if query:
+        db = SessionLocal()
+        try:
+            project_name = db.query(Project.name).filter(Project.id == project_id).scalar()
+            if project_name is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            query_embedding = generate_embedding(query)
+            hits = semantic_search(db, query_embedding, CHAT_CONTEXT_CANDIDATES, project_id=project_id, with_embedding=True)
+            candidates = [(row, score, decode_embedding(row.embedding, DIMENSION)) for row, score in hits if row.embedding]
+            return build_ranked_context(project_name, candidates, query_embedding, token_budget)
+        finally:
+            db.close()
+
+    # One primary-key read gives the version every worker agrees on; the ETag and cache follow from it
+    db = SessionLocal()
+    project = db.query(Project.name, Project.context_version).filter(Project.id == project_id).first()
+    if project is None:
+        db.close()
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    # Get all research items for this project
-    research_items = project.research_items
-    
-    # Format context for chat
-    context = {
-        "project_name": project.name,
-        "research_summary": [
-            {
-                "title": item.get("title", ""),
-                "url": item.get("url", ""),
-                "timestamp": item.get("timestamp", "")
-            }
-            for item in research_items
-        ]
-    }
-    
-    return context
+    project_name, version = project
+    etag = chat_context_cache.etag(project_id, version)
+    if request.headers.get("if-none-match") == etag:
+        db.close()
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = chat_context_cache.get(project_id, version)
+    if cached is not None:
+        db.close()
+        return Response(content=cached, media_type="application/json", headers={"ETag": etag})
+
+    def body():
+        try:
+            yield from stream_chat_context(
+                db, project_id, project_name,
+                on_complete=lambda payload: chat_context_cache.put(project_id, version, payload),
+            )
+        finally:
+            db.close()
+
+    return StreamingResponse(body(), media_type="application/json", headers={"ETag": etag})
 
 
 # ✅ Endpoint to retrieve all research items for a specific project
+# ✅ Project research listing: selectable fields and keyset pagination on (timestamp, id)
+RESEARCH_FIELDS = ("id", "title", "url", "project_id", "timestamp", "embedding")
+DEFAULT_RESEARCH_FIELDS = ("id", "title", "url", "project_id", "timestamp")
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp, item_id):
+    """Opaque cursor pointing just past the item with this (timestamp, id)."""
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, item_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_after(timestamp, item_id):
+    """Filter for items after (timestamp, id) in the listing order: timestamp desc (NULLs last), id desc."""
+    if timestamp is None:
+        return and_(ResearchItem.timestamp.is_(None), ResearchItem.id < item_id)
+    return or_(
+        ResearchItem.timestamp < timestamp,
+        and_(ResearchItem.timestamp == timestamp, ResearchItem.id < item_id),
+        ResearchItem.timestamp.is_(None),
+    )
+
+
 @app.get("/get_project_research/")
-def get_project_research(project_id: int, db: Session = Depends(get_db)):
-    """Fetch research items belonging to a specific project."""
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+def get_project_research(
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: str = ",".join(DEFAULT_RESEARCH_FIELDS),
+    db: Session = Depends(get_db),
+):
+    """Fetch a page of research items belonging to a specific project, newest first.
+
+    Pages are keyset-paginated on (timestamp, id): pass the returned `next_cursor` to get the next
+    page. `fields` is a comma-separated subset of RESEARCH_FIELDS; embeddings are only included
+    when asked for.
+    """
+    project_name = db.query(Project.name).filter(Project.id == project_id).scalar()
+    if project_name is None:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    return {"project_id": project.id, "project_name": project.name, "research_items": project.research_items}
+    selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in RESEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    columns = [ResearchItem.id, ResearchItem.timestamp] + [
+        getattr(ResearchItem, field) for field in selected if field not in ("id", "timestamp")
+    ]
+    query = db.query(*columns).filter(ResearchItem.project_id == project_id)
+    if cursor:
+        query = query.filter(keyset_after(*decode_cursor(cursor)))
+    rows = (
+        query.order_by(ResearchItem.timestamp.desc().nulls_last(), ResearchItem.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    page = rows[:limit]
+    research_items = []
+    for row in page:
+        item = {field: getattr(row, field) for field in selected}
+        if item.get("embedding") is not None:
+            item["embedding"] = decode_embedding(item["embedding"], DIMENSION).tolist()
+        research_items.append(item)
+
+    next_cursor = encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None
+    return {
+        "project_id": project_id,
+        "project_name": project_name,
+        "research_items": research_items,
+        "next_cursor": next_cursor,
+    }
 
 @app.post("/create_project/")
 def create_project(project_data: dict, db: Session = Depends(get_db)):
@@ -157,6 +460,30 @@ def create_project(project_data: dict, db: Session = Depends(get_db)):
     db.refresh(new_project)
     return {"id": new_project.id, "name": new_project.name}
 
+@app.delete("/research_items/{item_id}")
+def delete_research_item(item_id: int, db: Session = Depends(get_db)):
+    """Delete a research item; its vector leaves the index and its project's centroid on commit."""
+    ensure_index_loaded()
+    item = db.query(ResearchItem).filter(ResearchItem.id == item_id).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Research item not found")
+    db.delete(item)
+    db.commit()
+    return {"message": f"Research item {item_id} deleted"}
+
+@app.post("/research_items/{item_id}/move")
+def move_research_item(item_id: int, project_id: int = Body(..., embed=True), db: Session = Depends(get_db)):
+    """Move a research item to another project; its vector stays indexed and the centroids follow."""
+    ensure_index_loaded()
+    item = db.query(ResearchItem).filter(ResearchItem.id == item_id).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Research item not found")
+    if not db.query(Project.id).filter(Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    item.project_id = project_id
+    db.commit()
+    return {"message": f"Research item {item_id} moved to project {project_id}", "id": item_id, "project_id": project_id}
+
 @app.get("/get_top_projects")
 def get_top_projects():
     return {"projects": projects_db[:3]}
@@ -182,66 +509,243 @@ def get_db():
     finally:
         db.close()
 
-def load_saved_tabs():
-    """Load saved research items from the database into FAISS."""
-    db = SessionLocal()
-    research_items = db.query(ResearchItem).all()
-
-    print(f"🔄 Restoring {len(research_items)} saved tabs into FAISS index...")
+# ✅ Restore the index and centroids once, on first use or by the lifespan warm-up
+index_loaded = threading.Event()
+warmup_error = None
 
-    for item in research_items:
-        try:
-            embedding = np.array(json.loads(item.embedding), dtype=np.float32)
-            tab_id = int(hashlib.md5(item.url.encode()).hexdigest(), 16) % (10**10)
-            index.add_with_ids(np.array([embedding]), np.array([tab_id], dtype=np.int64))
-        except Exception as e:
-            print(f"❌ Error restoring embedding for {item.url}: {e}")
+def ensure_index_loaded():
+    """Block until the FAISS index and project centroids are restored (restoring them if nobody has yet)."""
+    if not index_loaded.is_set():
+        vector_state.restore()  # Idempotent; with the vector service, only the first worker's call does the work
+        index_loaded.set()
 
-    print("✅ All saved research items loaded into FAISS.")
-
-# ✅ Call this function on startup
-load_saved_tabs()
+def warm_up():
+    """Load everything the first request would otherwise wait for."""
+    global warmup_error
+    try:
+        ensure_index_loaded()
+        encoder.load()
+        logger.info("✅ Research API warm")
+    except Exception as e:
+        warmup_error = str(e)
+        logger.error(f"❌ Warm-up failed: {e}")
 
 
 # ✅ Function to generate embeddings
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
 def generate_embedding(text):
-    return embedding_model.encode(text).astype(np.float32)
+    """Unit-length embedding for `text` (inner product with another is cosine similarity)."""
+    return normalize_embeddings(embedding_cache.get(encoder.name, text, lambda t: vector_state.dispatcher.encode([t])[0]))
 
-# ✅ Find the most relevant project for a tab
-def find_relevant_project(title, url):
-    """Finds the most relevant project based on semantic similarity."""
-    response = requests.get("http://127.0.0.1:8000/get_projects/")
-    projects = response.json().get("projects", [])
+def generate_embeddings(texts, batch_size=EMBEDDING_BATCH_SIZE, encode=None):
+    """Encode many texts, running one batched model pass over the ones not already cached.
+
+    `encode(texts, batch_size)` overrides the in-process model, e.g. with the ingestion process pool.
+    """
+    encode = encode or vector_state.dispatcher.encode
+    vectors = embedding_cache.get_many(encoder.name, list(texts), lambda missing: encode(missing, batch_size))
+    return normalize_embeddings(np.array(vectors, dtype=np.float32).reshape(len(texts), DIMENSION))
 
-    if not projects:
-        return None  # No projects exist yet
 
-    tab_text = f"{title} {url}"
-    tab_embedding = np.array([generate_embedding(tab_text)], dtype=np.float32)
+SEARCH_MAX_K = 100
 
-    project_embeddings = []
-    project_ids = []
+PROJECT_SCAN_CHUNK = int(os.getenv("PROJECT_SCAN_CHUNK", "2000"))  # Stored embeddings scored per batch in project-scoped search
 
-    for project in projects:
-        if "embedding" in project:
-            project_embedding = np.array(json.loads(project["embedding"]), dtype=np.float32)
-            project_embeddings.append(project_embedding)
-            project_ids.append(project["id"])
 
-    if not project_embeddings:
-        return None
+def semantic_search(db, query, wanted, project_id=None, since=None, until=None, min_score=None, with_embedding=False, engine=None):
+    """Returns (row, cosine score) hits for a query embedding, best first, with filters applied in SQL.
 
-    project_embeddings = np.array(project_embeddings, dtype=np.float32)
-    index = faiss.IndexFlatL2(tab_embedding.shape[1])
-    index.add(project_embeddings)
+    With the FAISS engine, a project-scoped search only ever scores that project's items (see
+    project_hits); otherwise the search window widens until at least `wanted` hits survive the time
+    filters or the index is exhausted. The database engine applies the filters inside the similarity query.
+    """
+    columns = [ResearchItem.id, ResearchItem.title, ResearchItem.url, ResearchItem.project_id, ResearchItem.timestamp]
+    if with_embedding:
+        columns.append(ResearchItem.embedding)
 
-    distances, indices = index.search(tab_embedding, k=3)  # Find top 3 closest projects
-    best_match_idx = indices[0][0]
-    best_project_id = project_ids[best_match_idx]
+    if (engine or db_vector_search.VECTOR_SEARCH_ENGINE) == "database":
+        hits = db_vector_search.search(db, query, wanted, project_id, since, until, min_score)
+        rows_by_id = {row.id: row for row in db.query(*columns).filter(ResearchItem.id.in_([item_id for item_id, _ in hits]))}
+        return [(rows_by_id[item_id], score) for item_id, score in hits if item_id in rows_by_id]
 
-    similarity_score = 1 - distances[0][0]  # Convert distance to similarity score
+    if project_id is not None:
+        hits = project_hits(db, query, wanted, project_id, since, until, min_score)
+        rows_by_id = {row.id: row for row in db.query(*columns).filter(ResearchItem.id.in_([item_id for item_id, _ in hits]))}
+        return [(rows_by_id[item_id], score) for item_id, score in hits if item_id in rows_by_id]
 
-    return best_project_id if similarity_score > 0.7 else None  # Only return if above threshold
+    ensure_index_loaded()
+    query = np.array([query], dtype=np.float32)
+    filtered = since is not None or until is not None
+    fetch = wanted * (4 if filtered else 1)
+
+    while True:
+        fetch = min(fetch, index.ntotal)
+        if min_score is not None:
+            scores, item_ids = index.range_search(query, min_score)
+            fetch = index.ntotal  # Range search already saw every candidate
+        elif fetch:
+            scores, item_ids = (row[0] for row in index.search(query, fetch))
+        else:
+            scores, item_ids = [], []
+        hits = [(int(item_id), float(score)) for score, item_id in zip(scores, item_ids) if item_id >= 0]
+
+        # ✅ Hydrate every hit in one bulk query, applying the filters in SQL
+        rows = db.query(*columns).filter(ResearchItem.id.in_([item_id for item_id, _ in hits]))
+        if project_id is not None:
+            rows = rows.filter(ResearchItem.project_id == project_id)
+        if since is not None:
+            rows = rows.filter(ResearchItem.timestamp >= since)
+        if until is not None:
+            rows = rows.filter(ResearchItem.timestamp < until)
+        rows_by_id = {row.id: row for row in rows}
+
+        ranked = [(rows_by_id[item_id], score) for item_id, score in hits if item_id in rows_by_id]
+        if len(ranked) >= wanted or fetch >= index.ntotal:
+            return ranked
+        fetch *= 4  # Filters were too selective for this window; widen it
+
+
+def project_hits(db, query, wanted, project_id, since=None, until=None, min_score=None):
+    """(item_id, cosine score) hits among one project's items, best first, never touching other projects' vectors.
+
+    While the index is flat, FAISS searches exactly with a selector admitting only the project's ids.
+    A filtered HNSW/IVF search would miss most of them (the graph walk and the probed lists are sized for
+    unfiltered queries), so on those backends the project's stored embeddings are scored exactly
+    instead, PROJECT_SCAN_CHUNK at a time, keeping only the running top `wanted`.
+    """
+    scope = db.query(ResearchItem.id).filter(ResearchItem.project_id == project_id, ResearchItem.embedding.isnot(None))
+    if since is not None:
+        scope = scope.filter(ResearchItem.timestamp >= since)
+    if until is not None:
+        scope = scope.filter(ResearchItem.timestamp < until)
+    query = normalize_embeddings(np.array([query], dtype=np.float32))
+
+    ensure_index_loaded()
+    if index.kind() == "flat":
+        item_ids = [item_id for (item_id,) in scope]
+        if min_score is not None:
+            scores, hit_ids = index.range_search(query, min_score, ids=item_ids)
+        elif item_ids:
+            scores, hit_ids = (row[0] for row in index.search(query, min(wanted, len(item_ids)), ids=item_ids))
+        else:
+            scores, hit_ids = [], []
+        return [(int(item_id), float(score)) for score, item_id in zip(scores, hit_ids) if item_id >= 0]
+
+    hit_ids, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows = db.execute(scope.add_columns(ResearchItem.embedding).statement, execution_options={"yield_per": PROJECT_SCAN_CHUNK})
+    for chunk in rows.partitions():
+        hit_ids = np.concatenate([hit_ids, np.array([item_id for item_id, _ in chunk], dtype=np.int64)])
+        scores = np.concatenate([scores, decode_embeddings([embedding for _, embedding in chunk], DIMENSION) @ query[0]])
+        if min_score is not None:
+            keep = np.flatnonzero(scores > min_score)
+        elif len(scores) > wanted:
+            keep = np.argpartition(-scores, wanted)[:wanted]
+        else:
+            continue
+        hit_ids, scores = hit_ids[keep], scores[keep]
+
+    order = np.argsort(-scores, kind="stable")[:None if min_score is not None else wanted]
+    return [(int(hit_ids[i]), float(scores[i])) for i in order]
+
+
+@app.get("/search")
+def search_research(
+    q: str,
+    k: int = 10,
+    project_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+    cursor: Optional[str] = None,
+    engine: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Semantic search over saved research items, with optional project/time/score filters and cursor paging.
+
+    `score` is cosine similarity. With `min_score`, a range search returns only hits above it instead
+    of a top-k window. `engine` ("faiss" or "database") overrides VECTOR_SEARCH_ENGINE for this request.
+    """
+    if engine not in (None, "faiss", "database"):
+        raise HTTPException(status_code=400, detail="engine must be 'faiss' or 'database'")
+    k = max(1, min(k, SEARCH_MAX_K))
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One extra hit tells us whether another page exists
+    ranked = semantic_search(db, generate_embedding(q), offset + k + 1, project_id, since, until, min_score, engine=engine)
+    page = ranked[offset:offset + k]
+    return {
+        "results": [
+            {
+                "id": row.id,
+                "title": row.title,
+                "url": row.url,
+                "project_id": row.project_id,
+                "timestamp": row.timestamp,
+                "score": score,
+            }
+            for row, score in page
+        ],
+        "next_cursor": str(offset + k) if len(ranked) > offset + k else None,
+    }
+
+
+@app.get("/index/stats")
+def get_index_stats():
+    """Size, active backend and measured ANN recall of the research index."""
+    return index.stats()
+
+
+@app.get("/ready")
+def get_readiness():
+    """503 until the model, index and ingestion worker (this worker's or the leader's) are warm; 200 after."""
+    try:
+        ingest_worker_running = ingest_leader.state.stats()["running"]
+    except (OSError, VectorServiceError):
+        ingest_worker_running = False  # No leader elected yet
+    status = {
+        "index_loaded": index_loaded.is_set(),
+        "model_loaded": encoder.loaded,
+        "ingest_worker_running": ingest_worker_running,
+        "error": warmup_error,
+    }
+    status["ready"] = status["index_loaded"] and status["model_loaded"] and status["ingest_worker_running"]
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/embedding_dispatcher/stats")
+def get_embedding_dispatcher_stats():
+    """Batch sizes, queue waits and encode time of the micro-batching embedding dispatcher."""
+    return vector_state.dispatcher.stats()
+
+
+@app.get("/embedding_cache/stats")
+def get_embedding_cache_stats():
+    """Hit/miss counters and size of the shared embedding cache."""
+    return embedding_cache.stats()
+
+# ✅ Find the most relevant project for a tab
+def find_relevant_project(title, url, embedding=None):
+    """Finds the most relevant project based on semantic similarity."""
+    if embedding is None:
+        embedding = generate_embedding(f"{title} {url}")
+    ensure_index_loaded()
+    return project_router.best_project(embedding, threshold=0.7)  # Only return if above threshold
+
+
+@app.post("/route_tab/")
+def route_tab(tab_data: dict):
+    """Rank projects by similarity to a tab's title and URL."""
+    embedding = generate_embedding(f"{tab_data['title']} {tab_data['url']}")
+    ensure_index_loaded()
+    matches = project_router.route(embedding, k=int(tab_data.get("k", 3)))
+    return {
+        "project_id": matches[0][0] if matches else None,
+        "matches": [{"project_id": project_id, "score": score} for project_id, score in matches],
+    }
 
 # ✅ Function to get open tabs from Chrome (Mac users)
 def get_open_tabs():
@@ -275,157 +779,242 @@ def get_open_tabs():
         logger.error(f"❌ Error retrieving tabs: {e}")
         return []
 
-def prompt_for_project_assignment(tab_id, title, url):
-    """Prompts the user to assign a tab to an existing or new project."""
-    print(f"\n📝 Assign tab '{title}' ({url}) to a project? (yes/no)")
-    choice = input().strip().lower()
-
-    if choice != "yes":
-        return None  # Skip assignment
-
-    # ✅ Get projects
-    response = requests.get("http://127.0.0.1:8000/get_projects/")
-    projects = response.json().get("projects", [])
-
-    if projects:
-        print("\n📂 Existing Projects:")
-        for idx, project in enumerate(projects, 1):
-            print(f"{idx}. {project['name']} (ID: {project['id']})")
-
-        while True:
-            print("\n➡️ Choose an option:")
-            print("1️⃣ Assign to an existing project")
-            print("2️⃣ Create a new project")
-
-            project_choice = input("Enter 1 or 2: ").strip()
-
-            if project_choice == "1":
-                while True:
-                    try:
-                        selected_index = int(input("\n📂 Select a project by number: ").strip()) - 1
-                        if 0 <= selected_index < len(projects):
-                            return projects[selected_index]["id"]
-                        else:
-                            print("❌ Invalid selection. Choose a valid project number.")
-                    except ValueError:
-                        print("❌ Please enter a valid number.")
-            elif project_choice == "2":
-                new_project_name = input("\n✏️ Enter new project name: ").strip()
-                response = requests.post("http://127.0.0.1:8000/create_project/", json={"name": new_project_name})
-                if response.status_code == 200:
-                    return response.json()["id"]
-            else:
-                print("❌ Invalid choice. Enter 1 or 2.")
-
-    return None  # No project was assigned
-
-
-def check_project_overlap(tab_id, title, url):
+def check_project_overlap(tab_id, title, url, embedding=None):
     """Checks if the tab's content overlaps with research in any existing project."""
-    
-    # Get all projects first
-    projects_response = requests.get("http://127.0.0.1:8000/get_projects/")
-    projects = projects_response.json().get("projects", [])
+    if embedding is None:
+        embedding = generate_embedding(f"{title} {url}")
+    ensure_index_loaded()
+    return project_router.best_project(embedding, threshold=0.8)  # Only return if above threshold
+
+
+def find_saved_urls(db, spellings):
+    """Maps canonical URLs to the ids of items already saved under them, using one bulk query per chunk.
+
+    `spellings` maps each canonical URL to the URLs it was submitted as, so items saved before URLs
+    were canonicalized are still found.
+    """
+    urls = sorted(set(spellings).union(*spellings.values()))
+    saved = {}
+    for start in range(0, len(urls), 500):  # Stay below SQLite's bound-parameter limit
+        chunk = urls[start:start + 500]
+        for url, item_id in db.query(ResearchItem.url, ResearchItem.id).filter(ResearchItem.url.in_(chunk)):
+            saved.setdefault(canonicalize_url(url), item_id)
+    return saved
+
+
+def find_near_duplicates(db, titles, urls, embeddings):
+    """Per new item, the id of a saved item and the position of an earlier new item it near-duplicates (or None).
+
+    Saved candidates are each item's NEAR_DUPLICATE_CANDIDATES nearest neighbours in the index; the first
+    whose score, page (host and path) and title SimHash all pass wins (see dedup.py). Candidates within
+    the batch are compared pairwise the same way.
+    """
+    ensure_index_loaded()
+    saved = [None] * len(titles)
+    if len(titles) and index.ntotal:
+        scores, item_ids = index.search(np.asarray(embeddings, dtype=np.float32), min(NEAR_DUPLICATE_CANDIDATES, index.ntotal))
+        nearest = {
+            i: [(int(item_id), float(score)) for score, item_id in zip(scores[i], item_ids[i]) if item_id >= 0 and score >= NEAR_DUPLICATE_MIN_SCORE]
+            for i in range(len(titles))
+        }
+        candidate_ids = {item_id for hits in nearest.values() for item_id, _ in hits}
+        if candidate_ids:
+            saved_pages = {
+                item_id: (title, url)
+                for item_id, title, url in db.query(ResearchItem.id, ResearchItem.title, ResearchItem.url).filter(ResearchItem.id.in_(candidate_ids))
+            }
+            for i, hits in nearest.items():
+                saved[i] = next(
+                    (item_id for item_id, score in hits
+                     if item_id in saved_pages and is_near_duplicate(titles[i], urls[i], *saved_pages[item_id], score)),
+                    None,
+                )
+    return saved, collapse_batch(titles, urls, embeddings)
+
+
+def filter_new_tabs(db, tabs):
+    """Returns (title, canonical url) pairs for tabs whose page is not yet saved."""
+    candidates = {}
+    spellings = {}
+    for tab in tabs:
+        title = tab.get("title", "").strip()
+        url = tab.get("url", "").strip()
+        if title and url:
+            canonical = canonicalize_url(url)
+            candidates.setdefault(canonical, title)
+            spellings.setdefault(canonical, set()).add(url)
+
+    known_urls = find_saved_urls(db, spellings)
+    for url in known_urls:
+        print(f"🟢 Tab already saved: {candidates[url]} ({url})")
+
+    return [(title, url) for url, title in candidates.items() if url not in known_urls]
+
+
+def store_research_items(db, rows):
+    """Inserts (title, url, project_id, embedding) rows in one transaction; the commit indexes their vectors."""
+    new_items = [
+        ResearchItem(
+            title=title,
+            url=url,
+            project_id=project_id,
+            timestamp=datetime.utcnow(),
+            embedding=encode_embedding(embedding)  # Store embedding as raw bytes
+        )
+        for title, url, project_id, embedding in rows
+    ]
+    ensure_index_loaded()
+    db.add_all(new_items)
+    embeddings = np.array([embedding for *_, embedding in rows], dtype=np.float32).reshape(len(rows), DIMENSION)
+    db.flush()
+    db_vector_search.store_vectors(db, [item.id for item in new_items], embeddings)
+    db.commit()  # ✅ The ORM sync appends every new vector to FAISS in one WAL-logged add
+    return new_items
+
+
+def save_tabs(db, tabs, encode=None):
+    """Embeds all new tabs in one batch and saves those that match a project; the rest become pending."""
+    new_tabs = filter_new_tabs(db, tabs)
+    if not new_tabs:
+        return []
 
-    if not projects:
-        return None  # No projects exist yet
+    # ✅ Step 1: One batched model pass for every new tab
+    embeddings = generate_embeddings([f"{title} {url}" for title, url in new_tabs], encode=encode)
+
+    # ✅ Step 2: Drop near-duplicates of saved pages (or of another tab in this sweep)
+    saved, earlier = find_near_duplicates(db, [title for title, _ in new_tabs], [url for _, url in new_tabs], embeddings)
+
+    # ✅ Step 3: Route each tab to a project, or park it for the user to assign
+    rows = []
+    for i, ((title, url), embedding) in enumerate(zip(new_tabs, embeddings)):
+        if saved[i] is not None:
+            print(f"🟢 Tab is a near-duplicate of saved item {saved[i]}: {title} ({url})")
+            continue
+        if earlier[i] is not None:
+            print(f"🟢 Tab is a near-duplicate of another open tab: {title} ({url})")
+            continue
+        tab_id = tab_id_for_url(url)
+        project_id = check_project_overlap(tab_id, title, url, embedding)
+        if project_id is None:
+            entry = {
+                "tab_id": tab_id,
+                "title": title,
+                "url": url,
+                "suggestions": project_router.route(embedding, k=3),
+                "embedding": embedding,
+            }
+            if ingestion.pending.put(entry):  # Only the ingestion leader sweeps, so the state is local
+                print(f"📝 Tab '{title}' ({url}) needs a project assignment")
+            continue
+        rows.append((title, url, project_id, embedding))
 
-    tab_text = f"{title} {url}"
-    tab_embedding = np.array([generate_embedding(tab_text)], dtype=np.float32)
+    # ✅ Step 4: Store rows and FAISS vectors in bulk
+    if not rows:
+        return []
+    new_items = store_research_items(db, rows)
+    for item in new_items:
+        print(f"✅ Research item saved for project {item.project_id}")
+    return new_items
 
-    project_embeddings = []
-    project_ids = []
 
-    # Loop through each project and get research items
-    for project in projects:
-        project_id = project["id"]
-        research_response = requests.get(f"http://127.0.0.1:8000/get_project_research/?project_id={project_id}")
-        
-        if research_response.status_code != 200:
-            continue  # Skip if project research retrieval fails
-        
-        research_items = research_response.json().get("research_items", [])
-        
-        for research_item in research_items:
-            if "embedding" in research_item:
-                research_embedding = np.array(json.loads(research_item["embedding"]), dtype=np.float32)
-                project_embeddings.append(research_embedding)
-                project_ids.append(project_id)
+def call_ingestion(method, *args):
+    """Call `method` on the ingestion leader's state (in this worker if it leads); 503 while no leader is up."""
+    try:
+        return getattr(ingest_leader.state, method)(*args)
+    except (OSError, VectorServiceError) as e:
+        raise HTTPException(status_code=503, detail=f"Ingestion leader unavailable: {e}")
 
-    if not project_embeddings:
-        return None  # No research embeddings available for comparison
 
-    project_embeddings = np.array(project_embeddings, dtype=np.float32)
-    index = faiss.IndexFlatL2(tab_embedding.shape[1])
-    index.add(project_embeddings)
+@app.get("/pending_assignments/")
+def list_pending_assignments():
+    """Tabs the ingestion worker could not route to a project."""
+    pending = call_ingestion("list_pending")
+    return {
+        "pending": [
+            {
+                "tab_id": entry["tab_id"],
+                "title": entry["title"],
+                "url": entry["url"],
+                "suggestions": [{"project_id": pid, "score": score} for pid, score in entry["suggestions"]],
+            }
+            for entry in pending
+        ]
+    }
 
-    distances, indices = index.search(tab_embedding, k=3)  # Find top 3 closest research pieces
-    best_match_idx = indices[0][0]
-    best_project_id = project_ids[best_match_idx]
 
-    similarity_score = 1 - distances[0][0]  # Convert distance to similarity score
+@app.post("/pending_assignments/{tab_id}/assign")
+def resolve_pending_assignment(tab_id: int, assignment: dict, db: Session = Depends(get_db)):
+    """Saves a pending tab into an existing project (`project_id`) or a new one (`project_name`)."""
+    entry = call_ingestion("get_pending", tab_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Pending tab not found")
+
+    if assignment.get("project_id") is not None:
+        project = db.query(Project).filter(Project.id == assignment["project_id"]).first()
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+    elif assignment.get("project_name"):
+        project = Project(name=assignment["project_name"])
+        db.add(project)
+        db.commit()
+    else:
+        raise HTTPException(status_code=400, detail="Provide project_id or project_name")
 
-    return best_project_id if similarity_score > 0.8 else None  # Only return if above threshold
+    item, = store_research_items(db, [(entry["title"], entry["url"], project.id, entry["embedding"])])
+    call_ingestion("pop_pending", tab_id)
+    return {"message": "Research item saved successfully", "id": item.id, "project_id": project.id}
 
 
-# ✅ Modify auto_save_tabs() to include prompting
-def auto_save_tabs():
-    db = SessionLocal()  # Create a database session
+@app.delete("/pending_assignments/{tab_id}")
+def dismiss_pending_assignment(tab_id: int):
+    """Drops a pending tab without saving it (it is offered again if still open on a later sweep)."""
+    if not call_ingestion("dismiss", tab_id):
+        raise HTTPException(status_code=404, detail="Pending tab not found")
+    return {"message": f"Tab {tab_id} dismissed"}
 
-    while True:
-        print("🔄 Auto-saving open tabs...")
-        tabs = get_open_tabs()
-        current_time = datetime.utcnow().isoformat()
-
-        for tab in tabs:
-            title = tab.get("title", "").strip()
-            url = tab.get("url", "").strip()
-            if not title or not url:
-                continue
-
-            tab_id = int(hashlib.md5(url.encode()).hexdigest(), 16) % (10**10)
-            embedding = generate_embedding(title + " " + url)
-            embedding_np = np.array([embedding], dtype=np.float32)
-
-            # ✅ Check if tab is already saved in the DB
-            existing_item = db.query(ResearchItem).filter(ResearchItem.url == url).first()
-            if existing_item:
-                print(f"🟢 Tab already saved: {title} ({url})")
-                continue  # Skip if already saved
-
-            # ✅ Step 1: Prompt for project assignment
-            project_id = prompt_for_project_assignment(tab_id, title, url)
-
-            # ✅ Step 2: Check for relevant project merge
-            merged_project_id = check_project_overlap(tab_id, title, url)
-
-            if merged_project_id and merged_project_id != project_id:
-                print(f"🔗 Suggesting tab merge into project {merged_project_id}. Merging now...")
-                project_id = merged_project_id  # Set merged project as the final assignment
-
-            # ✅ Step 3: Store metadata in the database
-            new_research_item = ResearchItem(
-                title=title,
-                url=url,
-                project_id=project_id,
-                timestamp=datetime.utcnow(),
-                embedding=json.dumps(embedding.tolist())  # Store embedding as JSON
-            )
 
-            db.add(new_research_item)
-            db.commit()
+def ingest_tabs(tabs, encode=None):
+    """Ingestion worker step: save one batch of tabs with its own short-lived session."""
+    tab_ids = [TabDiff.tab_id(tab) for tab in tabs]
+    db = SessionLocal()
+    try:
+        print(f"🔄 Auto-saving {len(tabs)} open tabs...")
+        save_tabs(db, tabs, encode)
+        print("✅ Tabs saved successfully.")
+    except Exception:
+        tab_diff.forget(tab_ids)  # Retry them on the next sweep
+        raise
+    finally:
+        db.close()
+
+    # Every tab not waiting for a project is now saved (or was already): later sweeps skip it
+    pending = ingestion.pending.pending_ids(tab_ids)
+    tab_diff.mark_seen([
+        tab_id for tab, tab_id in zip(tabs, tab_ids)
+        if tab.get("title", "").strip() and tab.get("url", "").strip() and tab_id not in pending
+    ])
 
-            # ✅ Step 4: Save to FAISS
-            index.add_with_ids(embedding_np, np.array([tab_id], dtype=np.int64))
 
-            print(f"✅ Research item saved for project {project_id}")
+def collect_changed_tabs():
+    """Open tabs that appeared since the previous sweep and are not yet saved."""
+    return tab_diff.changed(get_open_tabs())
 
-        print("✅ Tabs saved successfully.")
-        time.sleep(300)  # Run every 5 minutes
-  # Run every 5 minutes
+
+# ✅ Background ingestion: sweep for new tabs on an adaptive interval, encode in a process pool.
+# Only the elected leader among the API workers sweeps and holds the seen tabs and pending assignments.
+tab_diff = TabDiff()
+ingest_worker = IngestWorker(
+    collect=collect_changed_tabs,
+    process=ingest_tabs,
+    encoder=(EMBEDDING_BACKEND, EMBEDDING_MODEL, DIMENSION),
+    processes=0 if VECTOR_SERVICE_SOCKET else INGEST_PROCESSES,  # The vector service already encodes out of process
+)
+ingestion = Ingestion(ingest_worker, tab_diff)
+ingest_leader = IngestLeader(ingestion)
 
 
-# ✅ Start background tasks
-threading.Thread(target=auto_save_tabs, daemon=True).start()
+@app.get("/ingest/status")
+def get_ingest_status():
+    return {**call_ingestion("stats"), "leader": ingest_leader.is_leader}
 
 #INITATE uvicorn fastapi_research_api:app --host 0.0.0.0 --port 8000 --reload
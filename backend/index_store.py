@@ -0,0 +1,634 @@
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+import faiss
+
+from embeddings import normalize_embeddings
+
+logger = logging.getLogger(__name__)
+
+# ✅ On-disk location of the FAISS snapshot and its write-ahead log
+INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "faiss_data")
+SNAPSHOT_EVERY = int(os.getenv("FAISS_SNAPSHOT_EVERY", "1000"))  # WAL records before a new snapshot is considered...
+SNAPSHOT_WAL_RATIO = float(os.getenv("FAISS_SNAPSHOT_WAL_RATIO", "0.5"))  # ...and WAL bytes, as a share of the snapshot's, before one is written
+
+# ✅ Search backend: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw". ANN backends start flat and are
+# trained automatically once the index holds FAISS_TRAIN_MIN vectors.
+INDEX_BACKEND = os.getenv("FAISS_INDEX_BACKEND", "flat")
+TRAIN_MIN = int(os.getenv("FAISS_TRAIN_MIN", "50000"))
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = 4 * sqrt(n)
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "48"))  # Sub-quantizers; must divide the dimension
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+RECALL_SAMPLE = 200
+RECALL_K = 10
+
+# ✅ Removed vectors the index cannot drop in place (HNSW, or any index while an ANN upgrade is training)
+# are tombstoned and skipped by searches; a snapshot compacts them once they exceed this share of the index
+COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.2"))
+
+WAL_ADD = 1
+WAL_REMOVE = 2
+
+
+class ReadWriteLock:
+    """Any number of readers, or one writer. Waiting writers hold off new readers, so a steady stream
+    of searches cannot starve an add. Not reentrant."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class IndexLockedError(RuntimeError):
+    """The index directory is already open in another process."""
+
+
+def tab_id_for_url(url):
+    """Stable 63-bit id for a URL, the same in every process and across restarts.
+
+    Keys tabs that have no database row (pending assignments, the standalone tab index); saved
+    research items are indexed by their ResearchItem.id instead.
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), "big") >> 1
+
+
+class PersistentIndex:
+    """FAISS IndexIDMap persisted as a snapshot file plus an append-only log of changes since it.
+
+    Vectors are L2-normalized on the way in and compared by inner product, so every score the
+    index returns is a cosine similarity in [-1, 1].
+
+    Startup memory-maps the snapshot and replays the (small) log instead of re-reading every
+    embedding from the database. Every change is appended to the log before it is applied, and
+    the log is folded into a fresh snapshot once it holds `snapshot_every` records and has grown to
+    `snapshot_wal_ratio` of the snapshot's size, so the cost of rewriting the snapshot stays
+    proportional to the data appended whatever the size of the index.
+
+    Removals drop vectors from a flat index immediately. Elsewhere they set a bit in a tombstone
+    bitmap over index positions, which searches pass to FAISS as a selector so dead vectors are
+    never returned; snapshots compact the index once tombstones pass `compact_ratio`.
+
+    Searches share a read lock and run in parallel; changes take the write lock. A snapshot writes
+    the index under the read lock and makes it durable holding no lock at all.
+    """
+
+    def __init__(self, dimension, directory=INDEX_DIR, snapshot_every=SNAPSHOT_EVERY, backend=INDEX_BACKEND, train_min=TRAIN_MIN,
+                 compact_ratio=COMPACT_RATIO, snapshot_wal_ratio=SNAPSHOT_WAL_RATIO):
+        self.dimension = dimension
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_wal_ratio = snapshot_wal_ratio
+        self.snapshot_path = os.path.join(directory, "research.index")
+        self.wal_path = os.path.join(directory, "research.wal")
+        self.tombstones_path = os.path.join(directory, "research.tombstones.npy")
+        self.meta_path = os.path.join(directory, "research.meta.json")  # Facts about the snapshot FAISS does not store (recall)
+        self.lock_path = os.path.join(directory, "research.lock")
+        self.wal_dtype = np.dtype([("op", "u1"), ("id", "<i8"), ("vector", "<f4", (dimension,))])
+        self.backend = backend
+        self.train_min = train_min
+        self.compact_ratio = compact_ratio
+        self.index = self._new_index()
+        self._dead = None  # Tombstone bitmap over index positions, None while nothing is tombstoned
+        self._dead_count = 0
+        self._live_params = None  # Search parameters selecting the live positions, built on demand
+        self._lock = ReadWriteLock()
+        self._snapshot_lock = threading.Lock()  # One snapshot writing the files at a time
+        self._wal_records = 0
+        self._snapshot_bytes = 0  # Size of the snapshot on disk
+        self._upgrading = False
+        self._upgrade_thread = None
+        self._owner = None  # Open lock file while this process owns the directory
+        self.recall = None  # recall@RECALL_K of the ANN index against exact search, once trained
+
+    def _new_index(self):
+        return faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+
+    # ------------------------------------------------------------------ ANN backends
+
+    def kind(self):
+        """Backend actually in use: "flat" until an ANN index has been trained."""
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexFlat):
+            return "flat"
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        return "ivf_pq" if isinstance(inner, faiss.IndexIVFPQ) else "ivf_flat"
+
+    def _factory_string(self, n):
+        if self.backend == "hnsw":
+            return f"HNSW{HNSW_M}"
+        nlist = IVF_NLIST or max(1, int(4 * np.sqrt(n)))
+        if self.backend == "ivf_pq":
+            return f"IVF{nlist},PQ{PQ_M}"
+        return f"IVF{nlist},Flat"
+
+    def _tune(self, index):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = HNSW_EF_SEARCH
+        elif isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = IVF_NPROBE
+        return index
+
+    def _needs_training(self):
+        return self.backend != "flat" and self.kind() == "flat" and self.index.ntotal >= self.train_min
+
+    def _train(self, ids, vectors):
+        """Build and fill the configured ANN index, and measure its recall against exact search."""
+        n = len(ids)
+        rng = np.random.default_rng(0)
+        order = rng.permutation(n)
+        held_out = order[:min(RECALL_SAMPLE, n // 10)]
+        train_rows = np.sort(order[len(held_out):][:256 * max(1, int(4 * np.sqrt(n)))])
+
+        index = faiss.IndexIDMap(faiss.index_factory(self.dimension, self._factory_string(n), faiss.METRIC_INNER_PRODUCT))
+        index.train(vectors[train_rows])
+        index.add_with_ids(vectors, ids)
+        self._tune(index)
+
+        recall = None
+        if len(held_out):
+            exact = faiss.IndexFlatIP(self.dimension)
+            exact.add(vectors)
+            k = min(RECALL_K, n)
+            _, truth = exact.search(vectors[held_out], k)
+            _, found = index.search(vectors[held_out], k)
+            truth_ids = ids[truth]
+            recall = float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth_ids, found)]))
+        return index, recall
+
+    def maybe_train(self, background=True):
+        """Replace the flat index with the configured ANN index once there are enough vectors.
+
+        Training runs on a copy of the data; searches keep using the flat index until the trained one
+        has caught up with vectors added meanwhile and is swapped in. If the flat index is replaced
+        meanwhile (load, rebuild), the trained copy is stale and is discarded instead.
+        Call once the index has been restored and checked against the database.
+        """
+        with self._lock.write():
+            if self._upgrading or not self._needs_training():
+                return
+            self._upgrading = True
+            source = self.index
+            n = source.ntotal
+            ids = faiss.vector_to_array(source.id_map).copy()
+            vectors = faiss.downcast_index(source.index).reconstruct_n(0, n)
+
+        def upgrade():
+            try:
+                logger.info(f"🏗️ Training {self.backend} index on {n} vectors...")
+                trained, recall = self._train(ids, vectors)
+                with self._lock.write():
+                    if self.index is not source:
+                        logger.info(f"⏹️ Index replaced while training, discarding the {self.backend} upgrade")
+                        return
+                    flat = faiss.downcast_index(self.index.index)
+                    if self.index.ntotal > n:  # Catch up with additions made while training
+                        trained.add_with_ids(
+                            flat.reconstruct_n(n, self.index.ntotal - n),
+                            faiss.vector_to_array(self.index.id_map)[n:].copy(),
+                        )
+                    # Positions are unchanged, so the tombstone bitmap carries over to the trained index
+                    self.index, self.recall = trained, recall
+                    self._set_dead(self._dead)
+                self.snapshot()
+                logger.info(f"✅ Switched to {self.backend} index (recall@{RECALL_K} vs flat: {recall})")
+            except Exception as e:
+                logger.error(f"❌ Training {self.backend} index failed, staying on flat: {e}")
+            finally:
+                self._upgrading = False
+
+        if background:
+            self._upgrade_thread = threading.Thread(target=upgrade, daemon=True)
+            self._upgrade_thread.start()
+        else:
+            upgrade()
+
+    def _wait_for_upgrade(self):
+        """Block until a background upgrade has finished (or discarded itself)."""
+        thread = self._upgrade_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    # ------------------------------------------------------------------ restore
+
+    def lock_directory(self):
+        """Take an exclusive flock on the index directory, held until close() or exit; a no-op if held already.
+
+        The snapshot, WAL and temp files have a single writer: two processes appending to one WAL,
+        truncating it on snapshot and renaming over each other's temp files would corrupt it. Raises
+        IndexLockedError when another process has the directory open.
+        """
+        if self._owner is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        owner = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner.seek(0)
+            pid = owner.read().strip() or "?"
+            owner.close()
+            raise IndexLockedError(f"FAISS index {self.directory} is already open in process {pid}")
+        owner.truncate(0)
+        owner.write(str(os.getpid()))
+        owner.flush()
+        self._owner = owner
+
+    def close(self):
+        """Release the directory lock (the in-memory index stays searchable)."""
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+
+    def load(self):
+        """Lock the directory, map the last snapshot (if any) and replay the write-ahead log on top of it."""
+        self.lock_directory()
+        with self._lock.write():
+            index = self._read_snapshot()
+            if index is not None and (index.d != self.dimension or index.metric_type != faiss.METRIC_INNER_PRODUCT):
+                logger.warning("⚠️ Snapshot dimension/metric does not match, discarding it and its WAL")
+                index = None
+                open(self.wal_path, "wb").close()
+            self.index = self._tune(index if index is not None else self._new_index())
+            self.recall = self._read_meta().get("recall") if self.kind() != "flat" else None
+            self._snapshot_bytes = os.path.getsize(self.snapshot_path) if os.path.exists(self.snapshot_path) else 0
+            self._load_tombstones()
+            self._replay_wal()
+            logger.info(f"✅ FAISS index restored: {self.index.ntotal} vectors ({self._wal_records} replayed from WAL)")
+        return self.index
+
+    def _read_snapshot(self):
+        """The snapshot on disk, or None if there is none or it cannot be read."""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            index = faiss.read_index(self.snapshot_path, faiss.IO_FLAG_MMAP)
+            if isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+                # Memory-mapped inverted lists are read-only, so IVF snapshots are read into memory
+                index = faiss.read_index(self.snapshot_path)
+            return index
+        except RuntimeError as e:
+            # Start empty and replay the WAL; the caller's consistency check rebuilds anything missing
+            logger.error(f"❌ FAISS snapshot {self.snapshot_path} is unreadable ({e}), starting from an empty index")
+            os.replace(self.snapshot_path, self.snapshot_path + ".corrupt")
+            return None
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _replay_wal(self):
+        self._wal_records = 0
+        if not os.path.exists(self.wal_path):
+            return
+
+        size = os.path.getsize(self.wal_path)
+        complete = size - size % self.wal_dtype.itemsize
+        if complete != size:
+            # A crash mid-append leaves a torn trailing record; drop it.
+            logger.warning(f"⚠️ Truncating {size - complete} bytes of torn WAL record")
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(complete)
+        if not complete:
+            return
+
+        records = np.fromfile(self.wal_path, dtype=self.wal_dtype)
+        # Replay runs of consecutive adds / removes in order, so a removed and re-added id ends up live.
+        # Ids are only ever added when not live, so an add of a live id is a record the snapshot already
+        # holds (a crash between writing it and trimming the WAL) and is skipped.
+        for run in np.split(records, np.flatnonzero(np.diff(records["op"])) + 1):
+            if run["op"][0] == WAL_ADD:
+                run = run[~np.isin(run["id"], self._live_ids())]
+                if len(run):
+                    self._apply_add(np.ascontiguousarray(run["id"]), normalize_embeddings(run["vector"]))
+            elif run["op"][0] == WAL_REMOVE:
+                self._apply_remove(np.ascontiguousarray(run["id"]))
+        self._wal_records = len(records)
+
+    def _load_tombstones(self):
+        self._set_dead(None)
+        if not os.path.exists(self.tombstones_path):
+            return
+        dead = np.load(self.tombstones_path)
+        if len(dead) != self.index.ntotal:
+            # Written for a different snapshot (a crash between the two writes); the caller's consistency check catches the difference
+            logger.warning(f"⚠️ Tombstones cover {len(dead)} vectors but the snapshot holds {self.index.ntotal}, ignoring them")
+            return
+        self._set_dead(dead)
+
+    def rebuild(self, ids, vectors):
+        """Replace the index with `vectors` keyed by `ids` and write a fresh snapshot.
+
+        A running ANN upgrade sees its source replaced and discards itself; once it has, the rebuilt
+        index is trained in its place if large enough.
+        """
+        with self._lock.write():
+            self.index = self._new_index()
+            self._set_dead(None)
+            if len(ids):
+                self.index.add_with_ids(normalize_embeddings(vectors), np.asarray(ids, dtype=np.int64))
+        self.snapshot()
+        self._wait_for_upgrade()
+        self.maybe_train(background=False)
+
+    def ids(self):
+        """Return the ids of the live (not removed) vectors in the index."""
+        with self._lock.read():
+            return self._live_ids()
+
+    def _live_ids(self):
+        ids = faiss.vector_to_array(self.index.id_map)
+        return ids if self._dead is None else ids[~self._dead]
+
+    def _id_map(self):
+        """Zero-copy view of the position -> id map; only valid until the index next changes."""
+        return faiss.rev_swig_ptr(self.index.id_map.data(), self.index.id_map.size())
+
+    def is_consistent(self, expected_ids):
+        """Check that the index holds exactly `expected_ids` (e.g. those derived from research_items)."""
+        current = self.ids()
+        expected = np.asarray(expected_ids, dtype=np.int64)
+        if len(current) != len(expected):
+            logger.warning(f"⚠️ FAISS index has {len(current)} vectors but database has {len(expected)}")
+            return False
+        if not np.array_equal(np.sort(current), np.sort(expected)):
+            logger.warning("⚠️ FAISS index ids do not match database ids")
+            return False
+        return True
+
+    # ------------------------------------------------------------------ writes
+
+    def add(self, ids, vectors):
+        """Append additions to the WAL, then apply them to the in-memory index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_embeddings(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension))
+        if not len(ids):
+            return
+
+        records = np.empty(len(ids), dtype=self.wal_dtype)
+        records["op"] = WAL_ADD
+        records["id"] = ids
+        records["vector"] = vectors
+
+        with self._lock.write():
+            self._append_wal(records)
+            self._apply_add(ids, vectors)
+            due = self._snapshot_due()
+        if due:
+            self.snapshot()
+        self.maybe_train()
+
+    def _apply_add(self, ids, vectors):
+        self.index.add_with_ids(vectors, ids)
+        if self._dead is not None:
+            self._set_dead(np.concatenate([self._dead, np.zeros(len(ids), dtype=bool)]))
+
+    def remove(self, ids):
+        """Append removals to the WAL, then drop (or tombstone) every live vector with one of `ids`."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+
+        records = np.zeros(len(ids), dtype=self.wal_dtype)
+        records["op"] = WAL_REMOVE
+        records["id"] = ids
+
+        with self._lock.write():
+            self._append_wal(records)
+            self._apply_remove(ids)
+            due = self._snapshot_due()
+        if due:
+            self.snapshot()
+
+    def _apply_remove(self, ids):
+        if self._dead is None and not self._upgrading and self.kind() == "flat":
+            self.index.remove_ids(faiss.IDSelectorBatch(ids))  # Flat storage compacts in place
+            return
+        # Positions stay fixed: HNSW cannot remove, and a training upgrade catches up by position
+        dead = np.isin(self._id_map(), ids)
+        self._set_dead(dead if self._dead is None else self._dead | dead)
+
+    def _set_dead(self, dead):
+        self._dead = dead if dead is not None and dead.any() else None
+        self._dead_count = int(dead.sum()) if self._dead is not None else 0
+        self._live_params = None
+
+    def export(self):
+        """(ids, vectors) of every live vector, e.g. to move them into another index."""
+        with self._lock.write():  # IVF may build its direct map
+            return self._export()
+
+    def _export(self):
+        live = np.arange(self.index.ntotal) if self._dead is None else np.flatnonzero(~self._dead)
+        ids = self._id_map()[live].copy()
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexIVF):
+            inner.make_direct_map()  # IVF lists are keyed by position; reconstruct needs the reverse map
+        vectors = inner.reconstruct_batch(live) if len(live) else np.empty((0, self.dimension), dtype=np.float32)
+        return ids, vectors
+
+    def _compact(self):
+        """Rebuild the index from its live vectors, dropping every tombstoned one."""
+        ids, vectors = self._export()
+        if self.kind() == "flat":
+            index = self._new_index()
+        else:
+            index = faiss.clone_index(self.index)  # Keeps the trained quantizer / graph parameters
+            index.reset()
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        logger.info(f"🧹 Compacted FAISS index: dropped {self._dead_count} removed vectors")
+        self.index = self._tune(index)
+        self._set_dead(None)
+
+    def _snapshot_due(self):
+        wal_bytes = self._wal_records * self.wal_dtype.itemsize
+        return self._wal_records >= self.snapshot_every and wal_bytes >= self.snapshot_wal_ratio * self._snapshot_bytes
+
+    def _append_wal(self, records):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.wal_path, "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._wal_records += len(records)
+
+    def snapshot(self):
+        """Write the current index and its tombstones atomically, compacting first if enough are dead, and reset the WAL.
+
+        Only compaction takes the write lock. The index is written to a temp file under the read lock,
+        so searches carry on and changes wait only for the copy into the page cache; the fsync and
+        rename that make it durable hold no lock. Records appended meanwhile stay in the WAL. A crash
+        before the WAL is trimmed replays records the new snapshot already holds; replay skips adds of
+        ids already live (see _replay_wal), so that is harmless.
+        """
+        with self._snapshot_lock:
+            with self._lock.write():
+                if self._dead is not None and not self._upgrading:
+                    # Flat compaction is a copy; rebuilding a graph or re-adding to IVF lists waits until it pays off
+                    if self.kind() == "flat" or self._dead_count > self.compact_ratio * len(self._dead):
+                        self._compact()
+
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.snapshot_path + ".tmp"
+            with self._lock.read():
+                faiss.write_index(self.index, tmp_path)
+                dead = None if self._dead is None else self._dead.copy()
+                meta = {"recall": self.recall}
+                covered = self._wal_records
+                vectors = self.ntotal
+
+            if dead is not None:
+                with open(self.tombstones_path + ".tmp", "wb") as f:
+                    np.save(f, dead)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(self.tombstones_path + ".tmp", self.tombstones_path)
+            elif os.path.exists(self.tombstones_path):
+                os.unlink(self.tombstones_path)
+            with open(self.meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.meta_path + ".tmp", self.meta_path)
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())  # Durable before it replaces the old snapshot and the WAL is trimmed
+            os.replace(tmp_path, self.snapshot_path)
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+            with self._lock.write():
+                self._trim_wal(covered)
+                self._snapshot_bytes = os.path.getsize(self.snapshot_path)
+        logger.info(f"💾 FAISS snapshot written ({vectors} vectors)")
+
+    def _trim_wal(self, covered):
+        """Drop the first `covered` WAL records (now in the snapshot), keeping any appended since."""
+        itemsize = self.wal_dtype.itemsize
+        if self._wal_records == covered:
+            open(self.wal_path, "wb").close()
+        else:
+            with open(self.wal_path, "rb") as f:
+                f.seek(covered * itemsize)
+                tail = f.read((self._wal_records - covered) * itemsize)
+            with open(self.wal_path + ".tmp", "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.wal_path + ".tmp", self.wal_path)
+        self._wal_records -= covered
+
+    # ------------------------------------------------------------------ reads
+
+    def _params(self, selector, *keep_alive):
+        """(inner index, search parameters) applying `selector` to inner-index positions, plus what it reads."""
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+        elif isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return (inner, params, selector) + keep_alive
+
+    def _search_params(self, ids=None):
+        """FAISS search parameters admitting only live positions, and with `ids` only those holding one of them."""
+        if self._dead is not None and self._live_params is None:
+            live = np.packbits(~self._dead, bitorder="little")
+            self._live_params = self._params(faiss.IDSelectorBitmap(len(self._dead), faiss.swig_ptr(live)), live)  # Reads `live` in place
+        if ids is None:
+            return self._live_params
+
+        batch = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+        wanted = faiss.IDSelectorTranslated(self.index.id_map, batch)  # Position -> id, then membership
+        if self._dead is None:
+            return self._params(wanted, batch)
+        return self._params(faiss.IDSelectorAnd(wanted, self._live_params[2]), batch, wanted, self._live_params)
+
+    def search(self, query, k, ids=None):
+        """Top-k (similarities, ids) for each query row, optionally only among the vectors keyed by `ids`."""
+        with self._lock.read():
+            query = normalize_embeddings(query)
+            if self._dead is None and ids is None:
+                return self.index.search(query, k)
+            inner, params, *_ = self._search_params(ids)
+            scores, positions = inner.search(query, k, params=params)
+            return scores, np.where(positions >= 0, self._id_map()[np.maximum(positions, 0)], -1)
+
+    def range_search(self, query, min_score, ids=None):
+        """(similarities, ids) of every vector whose cosine similarity to the single `query` exceeds `min_score`, best first.
+
+        With `ids`, only the vectors keyed by one of them are considered.
+        """
+        with self._lock.read():
+            query = normalize_embeddings(query).reshape(1, self.dimension)
+            if self._dead is None and ids is None:
+                _, scores, ids = self.index.range_search(query, min_score)
+            else:
+                inner, params, *_ = self._search_params(ids)
+                _, scores, positions = inner.range_search(query, min_score, params=params)
+                ids = self._id_map()[positions]
+        order = np.argsort(-scores)
+        return scores[order], ids[order]
+
+    @property
+    def ntotal(self):
+        """Live vectors (tombstoned ones excluded)."""
+        return self.index.ntotal - self._dead_count
+
+    def stats(self):
+        return {
+            "vectors": self.ntotal,
+            "configured_backend": self.backend,
+            "backend": self.kind(),
+            "train_min": self.train_min,
+            "training": self._upgrading,
+            "recall_at_10": self.recall,
+            "wal_records": self._wal_records,
+            "tombstones": self._dead_count,
+        }
@@ -0,0 +1,151 @@
+"""One tab sweeper across all API workers.
+
+Every uvicorn worker imports the API, but only one may sweep open tabs: several sweepers would race
+on the same URLs, overwrite each other's seen-tab files and each keep a different set of pending
+assignments. The workers elect a leader with an flock; the leader runs the IngestWorker, owns the
+TabDiff and the pending assignments, and serves them on INGEST_LEADER_SOCKET. The other workers
+proxy the pending-assignment and status endpoints to it, and one of them takes over if it exits.
+"""
+import os
+import fcntl
+import asyncio
+import logging
+import threading
+
+from vector_service import CallServer, RemoteObject, VectorServiceClient
+
+logger = logging.getLogger(__name__)
+
+# ✅ Leader election and the leader's socket (the flock is taken on INGEST_LEADER_SOCKET + ".pid")
+INGEST_LEADER_SOCKET = os.getenv("INGEST_LEADER_SOCKET", "ingest_leader.sock")
+INGEST_LEADER_RETRY = float(os.getenv("INGEST_LEADER_RETRY", "5"))  # Seconds between a follower's takeover attempts
+
+
+class PendingAssignments:
+    """Tabs that matched no project, waiting for the user to pick one (keyed by tab_id)."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, entry):
+        """Add or refresh an entry; True if the tab was not pending yet."""
+        with self._lock:
+            new = entry["tab_id"] not in self._entries
+            self._entries[entry["tab_id"]] = entry
+        return new
+
+    def get(self, tab_id):
+        with self._lock:
+            return self._entries.get(tab_id)
+
+    def pop(self, tab_id):
+        with self._lock:
+            return self._entries.pop(tab_id, None)
+
+    def pending_ids(self, tab_ids):
+        """The subset of `tab_ids` that is pending."""
+        with self._lock:
+            return {tab_id for tab_id in tab_ids if tab_id in self._entries}
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Ingestion:
+    """The leader's ingestion state, as served to the other workers."""
+
+    def __init__(self, worker, tab_diff):
+        self.worker = worker
+        self.tab_diff = tab_diff
+        self.pending = PendingAssignments()
+
+    def list_pending(self):
+        return self.pending.entries()
+
+    def get_pending(self, tab_id):
+        return self.pending.get(tab_id)
+
+    def pop_pending(self, tab_id):
+        return self.pending.pop(tab_id)
+
+    def dismiss(self, tab_id):
+        """Drop a pending tab so the next sweep offers it again if still open; False if it was not pending."""
+        if self.pending.pop(tab_id) is None:
+            return False
+        self.tab_diff.forget([tab_id])
+        return True
+
+    def stats(self):
+        return {**self.worker.stats(), **self.tab_diff.stats(), "pending_assignments": len(self.pending)}
+
+
+class IngestLeader:
+    """Runs `ingestion` in this worker once it wins the election; until then `state` proxies to the leader."""
+
+    def __init__(self, ingestion, path=INGEST_LEADER_SOCKET, retry=INGEST_LEADER_RETRY):
+        self.ingestion = ingestion
+        self.path = path
+        self.retry = retry
+        self.remote = RemoteObject(VectorServiceClient(path, autostart=False), "ingestion")
+        self.is_leader = False
+        self._owner = None
+        self._server = None
+        self._task = None
+
+    @property
+    def state(self):
+        """This worker's Ingestion if it leads, else a proxy to the leader's (calls raise OSError while none is up)."""
+        return self.ingestion if self.is_leader else self.remote
+
+    async def start(self):
+        self._task = asyncio.create_task(self._campaign())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            os.unlink(self.path)
+        if self.is_leader:
+            self.is_leader = False
+            await self.ingestion.worker.stop()
+        if self._owner is not None:
+            self._owner.close()  # Releases the flock: a follower takes over at its next attempt
+            self._owner = None
+
+    def _try_lock(self):
+        owner = open(self.path + ".pid", "a")
+        try:
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner.close()
+            return False
+        owner.truncate(0)
+        owner.write(str(os.getpid()))
+        owner.flush()
+        self._owner = owner
+        return True
+
+    async def _campaign(self):
+        while not self._try_lock():
+            await asyncio.sleep(self.retry)
+
+        await asyncio.to_thread(self.ingestion.tab_diff.load)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a leader that did not shut down cleanly
+        self._server = await asyncio.start_unix_server(
+            CallServer({"ingestion": self.ingestion})._handle, path=self.path
+        )
+        os.chmod(self.path, 0o600)  # Requests are pickles: only this user's processes may connect
+        await self.ingestion.worker.start()
+        self.is_leader = True
+        logger.info(f"✅ Leading tab ingestion (pid {os.getpid()}) on {self.path}")
@@ -0,0 +1,126 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from encoders import get_encoder
+
+logger = logging.getLogger(__name__)
+
+# ✅ Ingestion settings
+INGEST_INTERVAL = int(os.getenv("INGEST_INTERVAL", "300"))  # Seconds between open-tab sweeps, to start with
+INGEST_MIN_INTERVAL = int(os.getenv("INGEST_MIN_INTERVAL", "30"))  # Sweeps that find changes shorten the interval down to this...
+INGEST_MAX_INTERVAL = int(os.getenv("INGEST_MAX_INTERVAL", "1800"))  # ...and quiet sweeps lengthen it up to this
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))  # Pending tab batches before producers back off
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", "1"))  # Encoder processes (0 = encode in-thread)
+
+# Encoder loaded once per encoder process by _load_encoder()
+_process_encoder = None
+
+
+def _load_encoder(backend, model_name, dimension):
+    global _process_encoder
+    _process_encoder = get_encoder(backend, model_name, dimension)
+    _process_encoder.load()
+
+
+def _encode(texts, batch_size):
+    return _process_encoder.encode(texts, batch_size=batch_size)
+
+
+class IngestWorker:
+    """Background tab ingestion run on the API's event loop.
+
+    A sweeper task calls `collect()` and queues the tabs it returns; a consumer task drains the
+    bounded queue and hands each batch to `process(tabs, encode)`. `collect` returns only what changed,
+    so the interval adapts: a sweep that finds tabs halves it (down to `min_interval`) and an empty one
+    lengthens it by half (up to `max_interval`), sweeping often while tabs churn and rarely when idle.
+    Blocking work (tab collection, DB writes) runs in threads and model inference runs in a
+    separate process pool, so neither holds the GIL or the event loop while requests are served.
+    """
+
+    def __init__(self, collect, process, encoder, interval=INGEST_INTERVAL, min_interval=INGEST_MIN_INTERVAL,
+                 max_interval=INGEST_MAX_INTERVAL, queue_size=INGEST_QUEUE_SIZE, processes=INGEST_PROCESSES):
+        self.collect = collect
+        self.process = process
+        self.encoder = encoder  # (backend, model_name, dimension) passed to get_encoder() in each process
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.queue_size = queue_size
+        self.processes = processes
+        self.queue = None
+        self._executor = None
+        self._tasks = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.processes:
+            # spawn, not fork: the API process already runs threads and holds the FAISS index
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_load_encoder,
+                initargs=tuple(self.encoder),
+            )
+        self._tasks = [asyncio.create_task(self._sweep()), asyncio.create_task(self._consume())]
+        logger.info("✅ Ingestion worker started")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        logger.info("🛑 Ingestion worker stopped")
+
+    def submit(self, tabs):
+        """Queue a batch of tabs without waiting; raises asyncio.QueueFull when the worker is saturated."""
+        self.queue.put_nowait(list(tabs))
+
+    def encode(self, texts, batch_size):
+        """Encode `texts` in the process pool. Called from the consumer's worker thread."""
+        if self._executor is None:
+            return None
+        return self._executor.submit(_encode, list(texts), batch_size).result()
+
+    async def _sweep(self):
+        while True:
+            tabs = None
+            try:
+                tabs = await asyncio.to_thread(self.collect)
+                if tabs:
+                    await self.queue.put(tabs)  # Back-pressure: waits while the queue is full
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Tab sweep failed: {e}")
+            if tabs:
+                self.interval = max(self.min_interval, self.interval / 2)
+            else:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+            await asyncio.sleep(self.interval)
+
+    async def _consume(self):
+        while True:
+            tabs = await self.queue.get()
+            try:
+                await asyncio.to_thread(self.process, tabs, self.encode if self._executor else None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ingesting {len(tabs)} tabs failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            "queued_batches": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            "processes": self.processes,
+            "interval": self.interval,
+            "running": bool(self._tasks),
+        }
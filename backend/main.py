@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from routes import projects, research_items
 from fastapi_research_api import app as research_api
 
-app = FastAPI()
+app = FastAPI(lifespan=research_api.router.lifespan_context)  # ✅ Mounted apps don't run their own lifespan
 
 # Include routers from other files
 app.include_router(projects.router, prefix="/projects", tags=["Projects"])
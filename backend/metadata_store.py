@@ -0,0 +1,216 @@
+import os
+import json
+import mmap
+import struct
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ✅ Log records (puts + deletes) before they are merged into a fresh segment
+METADATA_COMPACT_EVERY = int(os.getenv("METADATA_COMPACT_EVERY", "1000"))
+
+_SEGMENT_HEADER = struct.Struct("<8sQ")  # magic, entry count
+_SEGMENT_MAGIC = b"METASEG1"
+_LOG_HEADER = struct.Struct("<BqI")  # op, id, payload length
+
+LOG_PUT = 1
+LOG_DELETE = 2
+
+
+class MetadataStore:
+    """Id -> JSON metadata, persisted as an immutable segment plus an append-only log of changes since it.
+
+    The segment is a sorted id table (ids, offsets, lengths as contiguous columns) followed by the
+    records. It is memory-mapped, so opening the store reads only the (small) log, and a lookup is
+    a binary search over the mapped ids. Every put or delete is a single append to the log; once the
+    log passes `compact_every` records it is merged into a new segment written aside and swapped in
+    atomically, so a crash at any point leaves either the old or the new segment plus a replayable log.
+    """
+
+    def __init__(self, path, compact_every=METADATA_COMPACT_EVERY):
+        self.segment_path = path + ".seg"
+        self.log_path = path + ".log"
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._segment = None
+        self._ids = self._offsets = self._lengths = np.empty(0, dtype="<i8")
+        self._changes = {}  # id -> payload bytes (None once deleted) for records still only in the log
+        self._log_records = 0
+        self._count = 0
+
+    # ------------------------------------------------------------------ restore
+
+    def load(self):
+        """Map the segment (if any) and replay the log on top of it."""
+        with self._lock:
+            self._map_segment()
+            self._replay_log()
+        logger.info(f"✅ Metadata store {self.segment_path} opened: {self._count} records ({self._log_records} replayed from log)")
+
+    def _map_segment(self):
+        # The column views borrow the old map, so they go before it is closed
+        self._ids = self._offsets = self._lengths = np.empty(0, dtype="<i8")
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if not os.path.exists(self.segment_path) or not os.path.getsize(self.segment_path):
+            return
+
+        with open(self.segment_path, "rb") as f:
+            self._segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _SEGMENT_HEADER.unpack_from(self._segment)
+        if magic != _SEGMENT_MAGIC:
+            raise ValueError(f"{self.segment_path} is not a metadata segment")
+        offset = _SEGMENT_HEADER.size
+        self._ids = np.frombuffer(self._segment, dtype="<i8", count=count, offset=offset)
+        self._offsets = np.frombuffer(self._segment, dtype="<u8", count=count, offset=offset + 8 * count)
+        self._lengths = np.frombuffer(self._segment, dtype="<u4", count=count, offset=offset + 16 * count)
+
+    def _replay_log(self):
+        self._changes, self._log_records, self._count = {}, 0, len(self._ids)
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position + _LOG_HEADER.size <= len(data):
+            op, record_id, length = _LOG_HEADER.unpack_from(data, position)
+            end = position + _LOG_HEADER.size + length
+            if end > len(data):
+                break
+            self._apply(record_id, data[position + _LOG_HEADER.size:end] if op == LOG_PUT else None)
+            self._log_records += 1
+            position = end
+
+        if position != len(data):
+            # A crash mid-append leaves a torn trailing record; drop it.
+            logger.warning(f"⚠️ Truncating {len(data) - position} bytes of torn metadata log record")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(position)
+
+    # ------------------------------------------------------------------ reads
+
+    def _find(self, record_id):
+        """Position of `record_id` in the segment, or -1."""
+        i = int(np.searchsorted(self._ids, record_id))
+        return i if i < len(self._ids) and self._ids[i] == record_id else -1
+
+    def _payload(self, i):
+        start = int(self._offsets[i])
+        return self._segment[start:start + int(self._lengths[i])]
+
+    def get(self, record_id, default=None):
+        """Metadata stored under `record_id` (O(log n), no full read of the store)."""
+        record_id = int(record_id)
+        with self._lock:
+            if record_id in self._changes:
+                payload = self._changes[record_id]
+            else:
+                i = self._find(record_id)
+                payload = self._payload(i) if i >= 0 else None
+        return default if payload is None else json.loads(payload)
+
+    def __contains__(self, record_id):
+        record_id = int(record_id)
+        with self._lock:
+            if record_id in self._changes:
+                return self._changes[record_id] is not None
+            return self._find(record_id) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        """(id, metadata) for every live record, in no particular order."""
+        with self._lock:
+            changes = dict(self._changes)
+            unchanged = [i for i, record_id in enumerate(self._ids.tolist()) if record_id not in changes]
+            payloads = [(int(self._ids[i]), self._payload(i)) for i in unchanged]
+        payloads += [(record_id, payload) for record_id, payload in changes.items() if payload is not None]
+        return [(record_id, json.loads(payload)) for record_id, payload in payloads]
+
+    # ------------------------------------------------------------------ writes
+
+    def put(self, record_id, metadata):
+        """Store (or replace) one record with a single log append."""
+        self.put_many([(record_id, metadata)])
+
+    def put_many(self, records):
+        """Store (id, metadata) pairs with one log append and one fsync."""
+        records = [(int(record_id), json.dumps(metadata).encode()) for record_id, metadata in records]
+        if not records:
+            return
+        log = b"".join(_LOG_HEADER.pack(LOG_PUT, record_id, len(payload)) + payload for record_id, payload in records)
+        with self._lock:
+            self._append_log(log, len(records))
+            for record_id, payload in records:
+                self._apply(record_id, payload)
+            self._maybe_compact()
+
+    def delete(self, record_ids):
+        """Delete records by id with one log append; unknown ids are ignored."""
+        with self._lock:
+            record_ids = [int(record_id) for record_id in record_ids if record_id in self]
+            if not record_ids:
+                return
+            self._append_log(b"".join(_LOG_HEADER.pack(LOG_DELETE, record_id, 0) for record_id in record_ids), len(record_ids))
+            for record_id in record_ids:
+                self._apply(record_id, None)
+            self._maybe_compact()
+
+    def _apply(self, record_id, payload):
+        existed = record_id in self
+        self._changes[record_id] = payload
+        self._count += (payload is not None) - existed
+
+    def _append_log(self, data, records):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_records += records
+
+    def _maybe_compact(self):
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Merge the log into a new segment and reset the log."""
+        with self._lock:
+            changed = np.fromiter(self._changes, dtype=np.int64, count=len(self._changes))
+            kept = np.flatnonzero(~np.isin(self._ids, changed))
+            puts = [(record_id, payload) for record_id, payload in self._changes.items() if payload is not None]
+
+            # Each record is copied from the old segment (True, position) or from the log (False, payload)
+            ids = np.concatenate([self._ids[kept], np.array([record_id for record_id, _ in puts], dtype=np.int64)])
+            lengths = np.concatenate([self._lengths[kept].astype(np.int64), np.array([len(p) for _, p in puts], dtype=np.int64)])
+            sources = [(True, int(i)) for i in kept] + [(False, payload) for _, payload in puts]
+            order = np.argsort(ids, kind="stable")
+            ids, lengths = ids[order], lengths[order]
+
+            data_start = _SEGMENT_HEADER.size + 20 * len(ids)
+            offsets = data_start + np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64) if len(ids) else np.empty(0, dtype=np.int64)
+
+            tmp_path = self.segment_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, len(ids)))
+                f.write(ids.astype("<i8").tobytes())
+                f.write(offsets.astype("<u8").tobytes())
+                f.write(lengths.astype("<u4").tobytes())
+                for i in order:
+                    from_segment, source = sources[i]
+                    f.write(self._payload(source) if from_segment else source)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp_path, self.segment_path)
+            open(self.log_path, "wb").close()  # A crash before this replays idempotent puts/deletes onto the new segment
+            self._map_segment()
+            self._changes, self._log_records, self._count = {}, 0, len(self._ids)
+        logger.info(f"💾 Metadata segment written ({self._count} records)")
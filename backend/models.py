@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
-from sqlalchemy.orm import relationship
+import numpy as np
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Index, event, inspect
+from sqlalchemy.orm import relationship, column_property, Session
 from database import Base
 from datetime import datetime
+from embeddings import encode_embedding, decode_embedding
 
 class Project(Base):
     __tablename__ = "projects"
@@ -9,17 +11,113 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
+    centroid = Column(LargeBinary, nullable=True)  # Mean embedding of the project's research items (float32 bytes)
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")  # Items folded into `centroid`
+    context_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped on every change to its chat context
 
     research_items = relationship("ResearchItem", back_populates="project")
 
+    def fold_embedding(self, embedding, sign=1):
+        """Add (sign=1) or remove (sign=-1) one item embedding from the running centroid."""
+        vector = decode_embedding(embedding).astype(np.float64)
+        count = self.item_count or 0
+        centroid = decode_embedding(self.centroid).astype(np.float64) if self.centroid else np.zeros_like(vector)
+
+        count += sign
+        if count <= 0:
+            self.centroid, self.item_count = None, 0
+            return
+        centroid += sign * (vector - centroid) / count
+        self.centroid, self.item_count = encode_embedding(centroid, np.dtype(np.float32)), count
+
+    def fold_embeddings(self, vectors):
+        """Add many item embeddings (an (n, dimension) array) to the running centroid at once."""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if not len(vectors):
+            return
+        count = self.item_count or 0
+        total = vectors.sum(axis=0)
+        if self.centroid:
+            total += decode_embedding(self.centroid).astype(np.float64) * count
+        count += len(vectors)
+        self.centroid, self.item_count = encode_embedding(total / count, np.dtype(np.float32)), count
+
 class ResearchItem(Base):
     __tablename__ = "research_items"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     url = Column(String, unique=True, nullable=False)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    # active_history loads the previous value on change so centroids can subtract it (see below)
+    project_id = column_property(Column(Integer, ForeignKey("projects.id"), nullable=False), active_history=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    embedding = Column(Text, nullable=True)  # Save FAISS embeddings as JSON strings
+    embedding = column_property(Column(LargeBinary, nullable=True), active_history=True)  # Raw float32/float16 bytes, see embeddings.py
 
     project = relationship("Project", back_populates="research_items")
+
+    # Per-project listings are ordered by timestamp (id breaks ties; SQLite keeps the rowid in every index)
+    __table_args__ = (Index("ix_research_items_project_id_timestamp", "project_id", "timestamp"),)
+
+
+# ✅ Keep Project.centroid in step with every research item add, move, re-embed or delete
+@event.listens_for(Session, "before_flush")
+def update_project_centroids(session, flush_context, instances):
+    folds = []  # (project_id, embedding, sign)
+
+    def fold(project_id, embedding, sign):
+        if project_id is not None and embedding:
+            folds.append((project_id, embedding, sign))
+
+    for obj in session.new:
+        if isinstance(obj, ResearchItem):
+            fold(obj.project_id, obj.embedding, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, ResearchItem):
+            project_history = inspect(obj).attrs.project_id.history
+            embedding_history = inspect(obj).attrs.embedding.history
+            fold(
+                project_history.deleted[0] if project_history.deleted else obj.project_id,
+                embedding_history.deleted[0] if embedding_history.deleted else obj.embedding,
+                -1,
+            )
+
+    for obj in session.dirty:
+        if not isinstance(obj, ResearchItem):
+            continue
+        state = inspect(obj)
+        project_history = state.attrs.project_id.history
+        embedding_history = state.attrs.embedding.history
+        if not project_history.has_changes() and not embedding_history.has_changes():
+            continue
+        old_project_id = project_history.deleted[0] if project_history.deleted else obj.project_id
+        old_embedding = embedding_history.deleted[0] if embedding_history.deleted else obj.embedding
+        fold(old_project_id, old_embedding, -1)
+        fold(obj.project_id, obj.embedding, 1)
+
+    if not folds:
+        return
+    projects = lock_projects(session, {project_id for project_id, _, _ in folds})
+    for project_id, embedding, sign in folds:
+        if project_id in projects:
+            projects[project_id].fold_embedding(embedding, sign)
+
+
+def lock_projects(session, project_ids):
+    """Projects by id, with their centroid and item_count re-read under a row lock held until commit.
+
+    Folding into a centroid is a read-modify-write; without the lock, two transactions folding into
+    the same project would each start from the same centroid and one update would be lost. Rows are
+    locked in id order so concurrent writers cannot deadlock. (SQLite has no row locks, but allows
+    only one writing transaction at a time.)
+    """
+    projects = {}
+    with session.no_autoflush:
+        for project_id in sorted(project_ids):
+            project = session.get(Project, project_id)
+            if project is None:
+                continue
+            if project not in session.new:
+                session.refresh(project, ["centroid", "item_count"], with_for_update=True)
+            projects[project_id] = project
+    return projects
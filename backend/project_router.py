@@ -0,0 +1,98 @@
+import logging
+import threading
+import numpy as np
+
+from models import Project
+from embeddings import decode_embedding, normalize_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectRouter:
+    """Routes a tab embedding to the closest project by cosine similarity to per-project centroids.
+
+    Centroids are kept as running sums and counts so an insert is O(dimension); the stacked
+    centroid matrix is rebuilt lazily on the next lookup after a change.
+    """
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self._sums = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._project_ids = np.empty(0, dtype=np.int64)
+        self._centroids = np.empty((0, dimension), dtype=np.float32)
+        self._dirty = False
+
+    def load(self, db):
+        """Load the centroids stored on each Project (O(projects), no research item scan)."""
+        sums, counts = {}, {}
+        rows = db.query(Project.id, Project.centroid, Project.item_count).filter(Project.centroid.isnot(None))
+        for project_id, centroid, item_count in rows:
+            if item_count:
+                sums[project_id] = decode_embedding(centroid, self.dimension).astype(np.float64) * item_count
+                counts[project_id] = item_count
+
+        with self._lock:
+            self._sums, self._counts = sums, counts
+            self._dirty = True
+        logger.info(f"✅ Project router loaded {len(sums)} project centroids")
+
+    def add(self, project_id, embedding):
+        """Fold a newly saved research item into its project's centroid."""
+        if project_id is None:
+            return
+        vector = np.asarray(embedding, dtype=np.float64).reshape(self.dimension)
+        with self._lock:
+            if project_id in self._sums:
+                self._sums[project_id] += vector
+            else:
+                self._sums[project_id] = vector.copy()
+            self._counts[project_id] = self._counts.get(project_id, 0) + 1
+            self._dirty = True
+
+    def remove(self, project_id, embedding):
+        """Take a deleted (or moved-away) research item out of its project's centroid."""
+        vector = np.asarray(embedding, dtype=np.float64).reshape(self.dimension)
+        with self._lock:
+            if project_id not in self._sums:
+                return
+            self._counts[project_id] -= 1
+            if self._counts[project_id] <= 0:
+                del self._sums[project_id], self._counts[project_id]
+            else:
+                self._sums[project_id] -= vector
+            self._dirty = True
+
+    def _matrix(self):
+        with self._lock:
+            if self._dirty:
+                project_ids = list(self._sums)
+                self._project_ids = np.array(project_ids, dtype=np.int64)
+                self._centroids = normalize_embeddings(
+                    np.array([self._sums[pid] for pid in project_ids], dtype=np.float32).reshape(len(project_ids), self.dimension)
+                )
+                self._dirty = False
+            return self._project_ids, self._centroids
+
+    def route(self, embedding, k=3, min_score=None):
+        """Return up to k (project_id, cosine similarity) pairs, best first, optionally above `min_score`."""
+        project_ids, centroids = self._matrix()
+        if not len(project_ids):
+            return []
+
+        query = normalize_embeddings(np.asarray(embedding, dtype=np.float32).reshape(self.dimension))
+        scores = centroids @ query
+        candidates = np.arange(len(project_ids)) if min_score is None else np.flatnonzero(scores > min_score)
+        if not len(candidates):
+            return []
+
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(project_ids[i]), float(scores[i])) for i in top]
+
+    def best_project(self, embedding, threshold):
+        """Return the most similar project id if its cosine similarity clears `threshold`, else None."""
+        matches = self.route(embedding, k=1, min_score=threshold)
+        return matches[0][0] if matches else None
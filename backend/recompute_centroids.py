@@ -0,0 +1,39 @@
+import numpy as np
+
+from database import SessionLocal
+from models import Project, ResearchItem
+from embeddings import encode_embedding, decode_embedding
+
+
+def recompute_project_centroids(db):
+    """Rebuild every Project.centroid and item_count from research_items in one streaming pass."""
+    sums, counts = {}, {}
+    rows = (
+        db.query(ResearchItem.project_id, ResearchItem.embedding)
+        .filter(ResearchItem.project_id.isnot(None), ResearchItem.embedding.isnot(None))
+    )
+    for project_id, embedding in rows.yield_per(1000):
+        vector = decode_embedding(embedding)
+        if project_id in sums:
+            sums[project_id] += vector
+        else:
+            sums[project_id] = vector.astype(np.float64)
+        counts[project_id] = counts.get(project_id, 0) + 1
+
+    projects = db.query(Project).all()
+    for project in projects:
+        count = counts.get(project.id, 0)
+        project.item_count = count
+        project.centroid = encode_embedding(sums[project.id] / count, np.dtype(np.float32)) if count else None
+
+    db.commit()
+    return len(projects)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        updated = recompute_project_centroids(db)
+        print(f"✅ Recomputed centroids for {updated} projects")
+    finally:
+        db.close()
@@ -0,0 +1,174 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+import numpy as np
+
+from index_store import PersistentIndex
+from metadata_store import MetadataStore
+
+logger = logging.getLogger(__name__)
+
+# ✅ Width of each time bucket, and how often the retention job looks for expired buckets
+SHARD_SECONDS = int(float(os.getenv("TAB_SHARD_HOURS", "1")) * 3600)
+RETENTION_INTERVAL = int(os.getenv("TAB_RETENTION_INTERVAL", "300"))
+
+
+class Shard:
+    """One time bucket: a FAISS index of its vectors and a metadata store keyed by the same ids."""
+
+    def __init__(self, directory, dimension, start):
+        self.directory = directory
+        self.start = start
+        self.index = PersistentIndex(dimension, directory=directory, backend="flat")
+        self.metadata = MetadataStore(os.path.join(directory, "metadata"))
+
+    def load(self):
+        self.index.load()
+        self.metadata.load()
+
+    def label(self):
+        return datetime.fromtimestamp(self.start, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+
+class ShardedIndex:
+    """Vectors with metadata, partitioned into fixed-width time buckets searched together.
+
+    Each bucket is its own directory (named by its start, in epoch seconds) holding a PersistentIndex
+    and a MetadataStore. Queries search every shard, or only those overlapping `since`, and merge the
+    per-shard top-k by score. Expiry detaches whole shards under a short lock and deletes their files
+    outside it, so it never scans entries, rewrites an index or holds up searches; records expire at
+    bucket granularity (up to one bucket width after their TTL).
+    """
+
+    def __init__(self, directory, dimension, shard_seconds=SHARD_SECONDS):
+        self.directory = directory
+        self.dimension = dimension
+        self.shard_seconds = shard_seconds
+        self._shards = {}  # bucket start -> Shard
+        self._lock = threading.Lock()
+        self._retention = None
+        self._stop_retention = threading.Event()
+
+    def load(self):
+        """Open every shard on disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            for name in sorted(os.listdir(self.directory)):
+                if name.isdigit() and os.path.isdir(os.path.join(self.directory, name)):
+                    self._open(int(name))
+        logger.info(f"✅ Sharded index {self.directory} loaded: {len(self._shards)} shards, {len(self)} records")
+
+    def _open(self, start):
+        shard = Shard(os.path.join(self.directory, str(start)), self.dimension, start)
+        shard.load()
+        self._shards[start] = shard
+        return shard
+
+    def _bucket(self, timestamp):
+        return int(timestamp // self.shard_seconds * self.shard_seconds)
+
+    def _current_shards(self, since=None):
+        """Shards newest first, optionally only those holding records from `since` (epoch seconds) on."""
+        with self._lock:
+            shards = sorted(self._shards.values(), key=lambda shard: shard.start, reverse=True)
+        if since is not None:
+            shards = [shard for shard in shards if shard.start + self.shard_seconds > since]
+        return shards
+
+    def __len__(self):
+        return sum(len(shard.metadata) for shard in self._current_shards())
+
+    # ------------------------------------------------------------------ writes
+
+    def add_many(self, records):
+        """Store (id, vector, metadata, timestamp) records, replacing any earlier record with the same id.
+
+        Records are grouped by bucket, so each shard gets one index append and one metadata append.
+        """
+        records = list(records)
+        if not records:
+            return
+        self.remove([record_id for record_id, *_ in records])
+
+        by_bucket = {}
+        for record_id, vector, metadata, timestamp in records:
+            by_bucket.setdefault(self._bucket(timestamp), []).append((int(record_id), vector, metadata))
+        for start, bucket in by_bucket.items():
+            with self._lock:
+                shard = self._shards.get(start) or self._open(start)
+            shard.index.add([record_id for record_id, _, _ in bucket], np.array([vector for _, vector, _ in bucket], dtype=np.float32))
+            shard.metadata.put_many((record_id, metadata) for record_id, _, metadata in bucket)
+
+    def add(self, record_id, vector, metadata, timestamp=None):
+        self.add_many([(record_id, vector, metadata, time.time() if timestamp is None else timestamp)])
+
+    def remove(self, record_ids):
+        """Remove records by id from whichever shards hold them."""
+        record_ids = [int(record_id) for record_id in record_ids]
+        for shard in self._current_shards():
+            held = [record_id for record_id in record_ids if record_id in shard.metadata]
+            if held:
+                shard.index.remove(held)
+                shard.metadata.delete(held)
+
+    # ------------------------------------------------------------------ reads
+
+    def search(self, query, k, since=None):
+        """Top-k (score, id, metadata) across shards, best first; `since` (epoch seconds) skips older shards."""
+        query = np.asarray(query, dtype=np.float32).reshape(1, self.dimension)
+        hits = []
+        for shard in self._current_shards(since):
+            fetch = min(k, shard.index.ntotal)
+            if not fetch:
+                continue
+            scores, ids = shard.index.search(query, fetch)
+            hits.extend((float(score), int(record_id), shard) for score, record_id in zip(scores[0], ids[0]) if record_id >= 0)
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        results = []
+        for score, record_id, shard in hits[:k]:
+            metadata = shard.metadata.get(record_id)
+            if metadata is not None:
+                results.append((score, record_id, metadata))
+        return results
+
+    # ------------------------------------------------------------------ retention
+
+    def drop_before(self, cutoff):
+        """Drop every shard whose bucket ended at or before `cutoff` (epoch seconds); returns the dropped shards."""
+        with self._lock:
+            expired = [shard for start, shard in self._shards.items() if start + self.shard_seconds <= cutoff]
+            for shard in expired:
+                del self._shards[shard.start]
+
+        # Searches already holding a shard finish on its in-memory index; the files can go
+        for shard in expired:
+            shutil.rmtree(shard.directory, ignore_errors=True)
+            shard.index.close()
+            logger.info(f"🗑️ Dropped shard {shard.label()} ({len(shard.metadata)} records)")
+        return expired
+
+    def start_retention(self, ttl_seconds, interval=RETENTION_INTERVAL):
+        """Drop shards older than `ttl_seconds` every `interval` seconds on a background thread."""
+        if self._retention is not None:
+            return
+        self._stop_retention.clear()
+
+        def run():
+            while not self._stop_retention.wait(interval):
+                try:
+                    self.drop_before(time.time() - ttl_seconds)
+                except Exception as e:
+                    logger.error(f"❌ Shard retention failed: {e}")
+
+        self._retention = threading.Thread(target=run, name="shard-retention", daemon=True)
+        self._retention.start()
+
+    def stop_retention(self):
+        self._stop_retention.set()
+        if self._retention is not None:
+            self._retention.join()
+            self._retention = None
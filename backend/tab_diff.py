@@ -0,0 +1,161 @@
+import os
+import math
+import logging
+import threading
+import numpy as np
+
+from dedup import canonicalize_url
+from index_store import tab_id_for_url
+
+logger = logging.getLogger(__name__)
+
+# ✅ Tabs already dealt with (saved, already saved or collapsed into a saved page), persisted across restarts
+TAB_SEEN_PATH = os.getenv("TAB_SEEN_PATH", "tab_seen")
+TAB_SEEN_CAPACITY = int(os.getenv("TAB_SEEN_CAPACITY", "100000"))  # Bloom filter sized for this many URLs...
+TAB_SEEN_FALSE_POSITIVE_RATE = float(os.getenv("TAB_SEEN_FALSE_POSITIVE_RATE", "0.01"))  # ...at this false-positive rate
+
+
+class BloomFilter:
+    """Bit array over 63-bit ids, probed with double hashing (id halves as the two base hashes)."""
+
+    def __init__(self, capacity, false_positive_rate, bits=None, hashes=None):
+        size = max(64, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.bits = bits if bits is not None else np.zeros((size + 7) // 8, dtype=np.uint8)
+        self.size = len(self.bits) * 8
+        self.hashes = hashes or max(1, round(self.size / capacity * math.log(2)))
+
+    def _positions(self, ids):
+        ids = np.asarray(ids, dtype=np.uint64).reshape(-1, 1)
+        h1, h2 = ids & np.uint64(0xFFFFFFFF), (ids >> np.uint64(32)) | np.uint64(1)
+        return (h1 + np.arange(self.hashes, dtype=np.uint64) * h2) % np.uint64(self.size)
+
+    def add(self, ids):
+        positions = self._positions(ids).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+
+    def might_contain(self, ids):
+        positions = self._positions(ids)
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+
+class SeenUrls:
+    """Persisted set of tab ids: a Bloom filter in front of an exact, memory-mapped sorted id array.
+
+    Almost every lookup of an unseen id ends at the Bloom filter; the rest (and every seen id) are
+    confirmed by a binary search over the mapped array, so a lookup never reads the whole set. New ids
+    are merged into the array and the filter, each rewritten aside and swapped in atomically.
+    """
+
+    def __init__(self, path=TAB_SEEN_PATH, capacity=TAB_SEEN_CAPACITY, false_positive_rate=TAB_SEEN_FALSE_POSITIVE_RATE):
+        self.ids_path = path + ".ids.npy"
+        self.bloom_path = path + ".bloom.npy"
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self._lock = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._bloom = BloomFilter(capacity, false_positive_rate)
+
+    def load(self):
+        with self._lock:
+            if os.path.exists(self.ids_path):
+                self._ids = np.load(self.ids_path, mmap_mode="r")
+            if os.path.exists(self.bloom_path) and len(self._ids) <= self.capacity:
+                bits = np.load(self.bloom_path)
+                self._bloom = BloomFilter(self.capacity, self.false_positive_rate, bits=bits[1:], hashes=int(bits[0]))
+            else:
+                # Missing, or outgrown: resize for the ids on hand so the false-positive rate holds
+                self.capacity = max(self.capacity, 2 * len(self._ids))
+                self._bloom = BloomFilter(self.capacity, self.false_positive_rate)
+                self._bloom.add(self._ids)
+        logger.info(f"✅ Seen tabs loaded: {len(self._ids)} URLs")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def contains(self, ids):
+        """Boolean mask of which `ids` have been seen."""
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            seen = self._bloom.might_contain(ids) if len(ids) else np.zeros(0, dtype=bool)
+            candidates = np.flatnonzero(seen)
+            if len(candidates):
+                positions = np.searchsorted(self._ids, ids[candidates])
+                positions[positions == len(self._ids)] = 0
+                seen[candidates] = len(self._ids) > 0 and self._ids[positions] == ids[candidates]
+        return seen
+
+    def add(self, ids):
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._lock:
+            ids = ids[~np.isin(ids, self._ids)]
+            if not len(ids):
+                return
+            merged = np.union1d(self._ids, ids)
+            if len(merged) > self.capacity:
+                self.capacity = max(2 * self.capacity, 2 * len(merged))
+                self._bloom = BloomFilter(self.capacity, self.false_positive_rate)
+                self._bloom.add(merged)
+            else:
+                self._bloom.add(ids)
+
+            self._write(self.ids_path, merged)
+            self._write(self.bloom_path, np.concatenate([[self._bloom.hashes], self._bloom.bits]).astype(np.uint8))
+            self._ids = np.load(self.ids_path, mmap_mode="r")
+
+    @staticmethod
+    def _write(path, array):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class TabDiff:
+    """Turns full open-tab lists into just the tabs that need ingesting.
+
+    A tab is passed on when it was not open at the previous sweep and its URL has not been seen
+    (saved, found already saved, or collapsed into a saved page). Tabs that stay open are skipped
+    until closed and reopened, or until `forget` re-offers them.
+    """
+
+    def __init__(self, seen=None):
+        self.seen = seen or SeenUrls()
+        self._open = set()  # Tab ids open at the previous sweep
+        self._lock = threading.Lock()
+        self.last_open = self.last_changed = 0
+
+    def load(self):
+        self.seen.load()
+
+    @staticmethod
+    def tab_id(tab):
+        return tab_id_for_url(canonicalize_url(tab.get("url", "")))
+
+    def changed(self, tabs):
+        """Tabs from a full sweep that are new since the previous one and not yet seen."""
+        tabs = [tab for tab in tabs if tab.get("title", "").strip() and tab.get("url", "").strip()]
+        ids = [self.tab_id(tab) for tab in tabs]
+        with self._lock:
+            opened = [i for i, tab_id in enumerate(ids) if tab_id not in self._open]
+            self._open = set(ids)
+        unseen = ~self.seen.contains([ids[i] for i in opened])
+        changed = [tabs[i] for i, keep in zip(opened, unseen) if keep]
+        self.last_open, self.last_changed = len(tabs), len(changed)
+        return changed
+
+    def mark_seen(self, tab_ids):
+        """Never pass these tabs on again (their pages are saved)."""
+        self.seen.add(list(tab_ids))
+
+    def forget(self, tab_ids):
+        """Pass these tabs on at the next sweep if they are still open."""
+        with self._lock:
+            self._open.difference_update(tab_ids)
+
+    def stats(self):
+        return {"open_tabs": self.last_open, "changed_tabs": self.last_changed, "seen_urls": len(self.seen)}
@@ -0,0 +1,320 @@
+"""Local vector service: one encoder, FAISS index and project router shared by every API worker.
+
+With VECTOR_SERVICE_SOCKET set, API processes talk to this service over a unix socket instead of
+each loading the model and index, so memory stays constant in the number of uvicorn workers and
+every worker searches the same index. The first worker to need it starts it (see
+VectorServiceClient); it can also be run on its own:
+
+    VECTOR_SERVICE_SOCKET=/tmp/research_vectors.sock python vector_service.py
+"""
+import os
+import sys
+import time
+import fcntl
+import pickle
+import signal
+import socket
+import struct
+import asyncio
+import logging
+import threading
+import subprocess
+from functools import cached_property
+
+logger = logging.getLogger(__name__)
+
+# ✅ "" keeps the model and index inside each API process
+VECTOR_SERVICE_SOCKET = os.getenv("VECTOR_SERVICE_SOCKET", "")
+VECTOR_SERVICE_AUTOSTART = os.getenv("VECTOR_SERVICE_AUTOSTART", "1") == "1"
+VECTOR_SERVICE_START_TIMEOUT = int(os.getenv("VECTOR_SERVICE_START_TIMEOUT", "120"))  # Seconds to wait for a spawned service
+
+_HEADER = struct.Struct(">Q")
+
+
+class VectorServiceError(RuntimeError):
+    """An operation failed inside the vector service."""
+
+
+def _send_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Vector service closed the connection")
+        buffer += chunk
+    return bytes(buffer)
+
+
+# ------------------------------------------------------------------ server
+
+
+class CallServer:
+    """Answers (target, method, args, kwargs) requests on a unix socket connection by calling public
+    methods of the named target objects; see VectorServiceClient for the other end."""
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                target, method, args, kwargs = pickle.loads(await reader.readexactly(size))
+                try:
+                    response = ("ok", await self._dispatch(target, method, args, kwargs))
+                except Exception as e:
+                    response = ("error", f"{type(e).__name__}: {e}")
+                payload = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+                writer.write(_HEADER.pack(len(payload)) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Worker went away, or this server is shutting down
+        finally:
+            writer.close()
+
+    async def _dispatch(self, target, method, args, kwargs):
+        if target not in self.targets or method.startswith("_"):
+            raise AttributeError(f"{target}.{method} is not available")
+        obj = self.targets[target]
+
+        def call():
+            value = getattr(obj, method)
+            return value(*args, **kwargs) if callable(value) else value
+
+        return await asyncio.to_thread(call)  # Index and DB work must not stall other workers' requests
+
+
+class VectorServer(CallServer):
+    """Serves a VectorState over a unix socket.
+
+    Requests are (target, method, args, kwargs) calls on the state, its index, router, encoder or
+    dispatcher. Encode requests from all connected workers go through the one dispatcher, so they
+    are coalesced into shared model calls.
+    """
+
+    def __init__(self, state, path):
+        super().__init__({
+            "state": state,
+            "index": state.index,
+            "router": state.project_router,
+            "encoder": state.encoder,
+            "dispatcher": state.dispatcher,
+        })
+        self.state = state
+        self.path = path
+
+    async def serve(self):
+        # Held for the service's lifetime: a second service started for the same socket exits here
+        owner = open(self.path + ".pid", "a")
+        try:
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info(f"Vector service already running on {self.path}")
+            owner.close()
+            return
+        owner.truncate(0)
+        owner.write(str(os.getpid()))
+        owner.flush()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a service that did not shut down cleanly
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)  # Requests are pickles: only this user's processes may connect
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        warmup = asyncio.create_task(asyncio.to_thread(self._warm_up))
+        logger.info(f"✅ Vector service listening on {self.path}")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            warmup.cancel()
+            if self.state.is_restored():
+                self.state.index.snapshot()
+            os.unlink(self.path)
+            owner.close()
+            logger.info("🛑 Vector service stopped")
+
+    def _warm_up(self):
+        try:
+            self.state.restore()
+            self.state.encoder.load()
+        except Exception as e:
+            logger.error(f"❌ Vector service warm-up failed: {e}")
+
+    async def _dispatch(self, target, method, args, kwargs):
+        if target == "dispatcher" and method == "encode":
+            # Awaited without holding a thread, so every waiting worker can join the same batch
+            return await asyncio.wrap_future(self.state.dispatcher.submit(args[0]))
+        return await super()._dispatch(target, method, args, kwargs)
+
+
+# ------------------------------------------------------------------ client
+
+
+class VectorServiceClient:
+    """Blocking client with one connection per thread; starts the service if nobody has yet."""
+
+    def __init__(self, path=VECTOR_SERVICE_SOCKET, autostart=VECTOR_SERVICE_AUTOSTART):
+        self.path = path
+        self.autostart = autostart
+        self._local = threading.local()
+
+    def _open(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            try:
+                sock = self._open()
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.autostart:
+                    raise
+                self._start_service()
+                sock = self._open()
+            self._local.sock = sock
+        return sock
+
+    def _start_service(self):
+        """Spawn the service unless another worker already has; the lock file makes that decision atomic."""
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._open().close()
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+
+            logger.info(f"🚀 Starting vector service on {self.path}")
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)],
+                env={**os.environ, "VECTOR_SERVICE_SOCKET": self.path},
+                start_new_session=True,  # Outlives the worker that happened to start it
+            )
+            deadline = time.monotonic() + VECTOR_SERVICE_START_TIMEOUT
+            while time.monotonic() < deadline:
+                if process.poll():  # Exit status 0 means a service was already starting; wait for its socket
+                    raise VectorServiceError(f"Vector service exited with status {process.returncode}")
+                try:
+                    self._open().close()
+                    return
+                except (FileNotFoundError, ConnectionRefusedError):
+                    time.sleep(0.1)
+            raise VectorServiceError(f"Vector service did not start within {VECTOR_SERVICE_START_TIMEOUT}s")
+
+    def call(self, target, method, *args, **kwargs):
+        payload = pickle.dumps((target, method, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            sock = self._connection()
+            _send_frame(sock, payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # A restarted service leaves stale connections; nothing was received, so resending is safe
+            self._local.sock = None
+            sock = self._connection()
+            _send_frame(sock, payload)
+
+        try:
+            (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+            status, value = pickle.loads(_recv_exactly(sock, size))
+        except (ConnectionError, OSError):
+            sock.close()
+            self._local.sock = None
+            raise
+        if status == "error":
+            raise VectorServiceError(value)
+        return value
+
+
+# ------------------------------------------------------------------ proxies with the local classes' interfaces
+
+
+class RemoteObject:
+    def __init__(self, client, target):
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._client.call(self._target, name, *args, **kwargs)
+
+
+class RemoteIndex(RemoteObject):
+    """PersistentIndex living in the vector service."""
+
+    @property
+    def ntotal(self):
+        return self._client.call(self._target, "ntotal")
+
+
+class RemoteEncoder(RemoteObject):
+    """Encoder living in the vector service; concurrent encodes from all workers share model calls."""
+
+    @cached_property
+    def backend(self):
+        return self._client.call(self._target, "backend")
+
+    @cached_property
+    def model_name(self):
+        return self._client.call(self._target, "model_name")
+
+    @cached_property
+    def name(self):
+        return self._client.call(self._target, "name")
+
+    @cached_property
+    def dimension(self):
+        return self._client.call(self._target, "dimension")
+
+    @property
+    def loaded(self):
+        return self._client.call(self._target, "loaded")
+
+    def encode(self, texts, batch_size=None):
+        return self._client.call("dispatcher", "encode", list(texts))  # The service picks the batch size
+
+    def encode_one(self, text):
+        return self.encode([text])[0]
+
+
+class RemoteVectorState(RemoteObject):
+    """VectorState living in the vector service."""
+
+    def __init__(self, client):
+        super().__init__(client, "state")
+        self.index = RemoteIndex(client, "index")
+        self.project_router = RemoteObject(client, "router")
+        self.encoder = RemoteEncoder(client, "encoder")
+        self.dispatcher = RemoteObject(client, "dispatcher")
+
+
+def remote_vector_state(path=VECTOR_SERVICE_SOCKET):
+    """Proxy for the shared VectorState; connects (and starts the service if needed) on first use."""
+    return RemoteVectorState(VectorServiceClient(path))
+
+
+if __name__ == "__main__":
+    from embeddings import EMBEDDING_DIMENSION
+    from encoders import get_encoder
+    from vector_state import VectorState
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    path = VECTOR_SERVICE_SOCKET or "vector_service.sock"
+    state = VectorState(EMBEDDING_DIMENSION, get_encoder(dimension=EMBEDDING_DIMENSION))
+    asyncio.run(VectorServer(state, path).serve())
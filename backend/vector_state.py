@@ -0,0 +1,177 @@
+import logging
+import threading
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ResearchItem
+from index_store import PersistentIndex
+from project_router import ProjectRouter
+from embeddings import decode_embedding, decode_embeddings
+from embedding_dispatcher import EmbeddingDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class VectorState:
+    """Everything search and routing keep in memory: the FAISS index (keyed by ResearchItem.id, so a hit
+    is hydrated straight from the primary key) and the project centroids, restored together and updated
+    together, plus the encoder and the dispatcher that batches concurrent requests to it.
+
+    One instance lives in each API process, or a single one in the vector service shared by all of
+    them (see vector_service.py).
+    """
+
+    def __init__(self, dimension, encoder=None):
+        self.dimension = dimension
+        self.encoder = encoder
+        self.dispatcher = EmbeddingDispatcher(encoder.encode) if encoder is not None else None
+        self.index = PersistentIndex(dimension)
+        self.project_router = ProjectRouter(dimension)
+        self.restored = threading.Event()
+        self._restore_lock = threading.Lock()
+
+    def restore(self):
+        """Restore the index and centroids once; later calls return as soon as that has finished."""
+        if self.restored.is_set():
+            return
+        with self._restore_lock:
+            if self.restored.is_set():
+                return
+            db = SessionLocal()
+            try:
+                self._restore_index(db)
+                self.project_router.load(db)
+            finally:
+                db.close()
+            self.restored.set()
+
+    def is_restored(self):
+        return self.restored.is_set()
+
+    def _restore_index(self, db):
+        """Map the on-disk snapshot, rebuilding from the database only if they disagree."""
+        self.index.load()
+
+        # ✅ Consistency check: the index must hold exactly the ids of the embedded research items
+        item_ids = [item_id for (item_id,) in db.query(ResearchItem.id).filter(ResearchItem.embedding.isnot(None))]
+        if self.index.is_consistent(item_ids):
+            self.index.maybe_train()  # Only a verified index is worth training
+            return
+
+        print(f"🔄 Rebuilding FAISS index from {len(item_ids)} saved tabs...")
+        ids, blobs = [], []
+        rows = db.query(ResearchItem.id, ResearchItem.url, ResearchItem.embedding).filter(ResearchItem.embedding.isnot(None))
+        for item_id, url, embedding in rows.yield_per(1000):
+            if len(embedding) not in (self.dimension * 2, self.dimension * 4):
+                print(f"❌ Error restoring embedding for {url}: unexpected size {len(embedding)} bytes")
+                continue
+            ids.append(item_id)
+            blobs.append(embedding)
+
+        self.index.rebuild(ids, decode_embeddings(blobs, self.dimension))
+        print("✅ All saved research items loaded into FAISS.")
+
+    def add(self, items, vectors):
+        """Index newly saved research items, given as (item_id, project_id) with their unit-length vectors."""
+        if not items:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(items), self.dimension)
+        self.index.add([item_id for item_id, _ in items], vectors)  # One append, logged to the WAL before it is applied
+        for (_, project_id), vector in zip(items, vectors):
+            self.project_router.add(project_id, vector)
+
+    def sync(self, removed, added, moved):
+        """Apply one flush's committed research item changes (see sync_with_orm).
+
+        `removed` and `added` hold (item_id, project_id, embedding bytes) for vectors leaving and
+        entering the index (a re-embed is both); `moved` holds (item_id, old_project_id,
+        new_project_id, embedding bytes) for items that only changed project, whose vector stays put.
+        """
+        with self._restore_lock:
+            if not self.is_restored():
+                return  # restore() reads the committed rows itself
+
+            if removed:
+                self.index.remove([item_id for item_id, _, _ in removed])  # Logged to the WAL; tombstoned where FAISS cannot remove
+                for _, project_id, embedding in removed:
+                    self.project_router.remove(project_id, decode_embedding(embedding, self.dimension))
+
+            for item_id, old_project_id, new_project_id, embedding in moved:
+                vector = decode_embedding(embedding, self.dimension)
+                self.project_router.remove(old_project_id, vector)
+                self.project_router.add(new_project_id, vector)
+
+            if added:
+                vectors = decode_embeddings([embedding for *_, embedding in added], self.dimension)
+                self.add([(item_id, project_id) for item_id, project_id, _ in added], vectors)
+
+
+# ✅ ORM-driven index maintenance: every ResearchItem insert, delete, move or re-embed that goes
+# through a Session reaches the index once its transaction commits. (Core bulk inserts bypass the ORM and
+# call VectorState.add themselves.)
+_synced_states = []
+
+
+def sync_with_orm(state):
+    """Keep `state` (a VectorState or its vector service proxy) in step with committed ORM changes."""
+    _synced_states.append(state)
+
+
+def _old_value(state, attribute, current):
+    """An attribute's value before this flush (`current` if it did not change)."""
+    history = state.attrs[attribute].history
+    return history.deleted[0] if history.deleted else current
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_vector_changes(session, flush_context):
+    if not _synced_states:
+        return
+    removed, added, moved = [], [], []
+
+    for obj in session.new:
+        if isinstance(obj, ResearchItem) and obj.embedding:
+            added.append((obj.id, obj.project_id, obj.embedding))
+
+    for obj in session.deleted:
+        if isinstance(obj, ResearchItem):
+            state = inspect(obj)
+            embedding = _old_value(state, "embedding", obj.embedding)
+            if embedding:
+                removed.append((obj.id, _old_value(state, "project_id", obj.project_id), embedding))
+
+    for obj in session.dirty:
+        if not isinstance(obj, ResearchItem):
+            continue
+        state = inspect(obj)
+        old_project_id = _old_value(state, "project_id", obj.project_id)
+        old_embedding = _old_value(state, "embedding", obj.embedding)
+        if old_embedding == obj.embedding:
+            if old_project_id != obj.project_id and obj.embedding:
+                moved.append((obj.id, old_project_id, obj.project_id, obj.embedding))
+            continue
+        if old_embedding:
+            removed.append((obj.id, old_project_id, old_embedding))
+        if obj.embedding:
+            added.append((obj.id, obj.project_id, obj.embedding))
+
+    if removed or added or moved:
+        session.info.setdefault("vector_changes", []).append((removed, added, moved))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_vector_changes(session):
+    for removed, added, moved in session.info.pop("vector_changes", ()):
+        for state in _synced_states:
+            try:
+                state.sync(removed, added, moved)
+            except Exception as e:
+                # The row change is committed; the next restore's consistency check repairs the index
+                logger.error(f"❌ Applying research item changes to the vector index failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_vector_changes(session):
+    session.info.pop("vector_changes", None)